@@ -59,6 +59,31 @@ F -> G back
 G -> F tree
 H -> G tree
 
+>>> V = "ABCD"
+>>> E = dict(A = "BC", B = "D", C = "D", D = "")
+>>> for e in dfs_events((V,E)): print(*e)
+discover A None
+tree A B
+discover B A
+tree B D
+discover D B
+finish D B
+finish B A
+tree A C
+discover C A
+cross C D
+finish C A
+finish A None
+
+There is no recursion, so long paths are fine:
+
+>>> n = 100000
+>>> V = list(xrange(n))
+>>> E = dict( (u,[u+1] if u+1 < n else []) for u in V )
+>>> p, ts, d, f = dfs((V,E))
+>>> len(ts), d[n-1], f[0]
+(1, 100000, 200000)
+
                                                                 # }}}2
 
 Topological sort and longest path                               # {{{2
@@ -72,6 +97,37 @@ Topological sort and longest path                               # {{{2
 deque(['F', 'G', 'A', 'E', 'B', 'C', 'D'])
 >>> longest_path(G)
 3
+>>> length, path, earliest, latest = critical_path(G)
+>>> length, path
+(3, ['A', 'B', 'C', 'D'])
+>>> list(zip(V, earliest, latest))
+[('A', 0, 0), ('B', 1, 1), ('C', 2, 2), ('D', 3, 3), ('E', 1, 3), ('F', 0, 2), ('G', 1, 3)]
+
+With task durations (and edge delays):
+
+>>> V = "ABCDE"
+>>> E = dict(A = "BC", B = "D", C = "D", D = "E", E = "")
+>>> duration = dict(A = 3, B = 2, C = 4, D = 2, E = 1)
+>>> length, path, earliest, latest = critical_path((V,E),
+...                                                duration = duration)
+>>> length, path
+(10, ['A', 'C', 'D', 'E'])
+>>> [ (u, es, ls - es) for u, es, ls in zip(V, earliest, latest) ]
+[('A', 0, 0), ('B', 3, 2), ('C', 3, 0), ('D', 7, 0), ('E', 9, 0)]
+>>> w = dict(A = dict(B = 0, C = 0), B = dict(D = 3), C = dict(D = 0),
+...          D = dict(E = 0.5))
+>>> length, path, earliest, latest = critical_path((V,E), w, duration)
+>>> length, path
+(11.5, ['A', 'B', 'D', 'E'])
+>>> earliest.tolist()
+[0.0, 3.0, 3.0, 8.0, 10.5]
+>>> critical_path((V,dict(E, E = "A")))
+Traceback (most recent call last):
+  ...
+DirectedCycle: ['C', 'D', 'E', 'A']
+>>> try: critical_path((V,dict(E, A = "BC", D = "BE")))
+... except DirectedCycle as e: e.cycle
+['D', 'B']
 
 >>> V = "ABCDEFG"
 >>> E = dict(A = "BCE", B = "C", C = "D", D = "", E = "", \
@@ -80,6 +136,49 @@ deque(['F', 'G', 'A', 'E', 'B', 'C', 'D'])
 >>> topological_sort2(G)
 ['F', 'G', 'A', 'E', 'B', 'C', 'D']
 
+A topological order can be maintained incrementally:
+
+>>> D = DynamicDAG(G); D.order()
+['F', 'G', 'A', 'E', 'B', 'C', 'D']
+>>> D.add_edge('D', 'F'); D.order()
+['A', 'B', 'C', 'E', 'D', 'F', 'G']
+>>> D.add_edge('G', 'B')
+Traceback (most recent call last):
+  ...
+DirectedCycle: ['G', 'B', 'C', 'D', 'F']
+>>> D.remove_edge('D', 'F'); D.add_edge('G', 'B'); D.order()
+['A', 'F', 'G', 'E', 'B', 'C', 'D']
+>>> D.add_edge('H', 'F'); D.add_edge('E', 'H'); D.order()
+['A', 'E', 'H', 'F', 'G', 'B', 'C', 'D']
+>>> DynamicDAG((V,dict(E, D = "A")))
+Traceback (most recent call last):
+  ...
+DirectedCycle: ['D', 'A', 'C']
+
+>>> def is_topological(vs, E):
+...   i = dict( (u,n) for n, u in enumerate(vs) )
+...   return all( i[u] < i[v] for u in E for v in E[u] )
+>>> import random
+>>> random.seed(1)
+>>> ok = 0
+>>> for n in xrange(50):
+...   V = list(xrange(15)); E = dict( (u,[]) for u in V )
+...   D = DynamicDAG((V,E))
+...   for i in xrange(40):
+...     u, v = random.sample(V, 2)
+...     if random.random() < 0.2 and E[u]:
+...       v = random.choice(E[u]); D.remove_edge(u, v); E[u].remove(v)
+...       continue
+...     try:
+...       D.add_edge(u, v)
+...       if v not in E[u]: E[u].append(v)
+...     except DirectedCycle as e:
+...       c = e.cycle; assert c[0] == u and c[1] == v
+...       assert all( y in E[x] for x, y in zip(c[1:], c[2:] + c[:1]) )
+...   if is_topological(D.order(), E): ok += 1
+>>> ok
+50
+
                                                                 # }}}2
 
 Strongly connected components                                   # {{{2
@@ -98,11 +197,24 @@ CD  ['FG', 'H']
 FG  ['H']
 H   []
 
+>>> comp, C = scc_tarjan(G)
+>>> comp.tolist()
+[0, 0, 1, 1, 0, 2, 2, 3]
+>>> [ C.neighbors(c).tolist() for c in xrange(len(C)) ]
+[[1, 2], [2, 3], [3], []]
+
+>>> n = 100000
+>>> V = list(xrange(n)); E = dict( (u,[(u+1) % n]) for u in V )
+>>> comp, C = scc_tarjan((V,E))
+>>> len(C), max(comp)
+(1, 0)
+
                                                                 # }}}2
 
 Dijkstra's algorithm                                            # {{{2
 --------------------
 
+>>> import random
 >>> V = "ABCDEFGH"
 >>> w = dict(A = dict(B =  5, E =  4),
 ...          B = dict(A =  5, C =  6, E =  3, F = 14, G = 10),
@@ -130,6 +242,46 @@ H [(28, 'H')] [('A', 0), ('B', 5), ('C', 11), ('D', 12), ('E', 4), ('F', 15), ('
 >>> sorted(p.items())
 [('A', None), ('B', 'A'), ('C', 'B'), ('D', 'C'), ('E', 'A'), ('F', 'E'), ('G', 'B'), ('H', 'D')]
 
+With an indexed d-ary heap (w/ decrease-key), the queue never holds
+more than one entry per vertex:
+
+>>> sizes = []
+>>> def at_dequeue(u, q, d): sizes.append(len(q))
+>>> d2, p2 = dijkstra(G, s, w, at_dequeue = at_dequeue, dary = 4)
+>>> sizes
+[0, 1, 1, 2, 3, 2, 1, 0]
+>>> d2 == d and p2 == p
+True
+
+Point-to-point queries stop as soon as the target is settled:
+
+>>> d, p = dijkstra(G, s, w, t = 'D')
+>>> d['D'], shortest_path(p, 'D')
+(12, ['A', 'B', 'C', 'D'])
+>>> d['H'] >= 24        # not settled: just an upper bound (or None)
+True
+>>> bidirectional_dijkstra(G, 'A', 'H', w)
+(24, ['A', 'B', 'C', 'D', 'H'])
+>>> bidirectional_dijkstra(G, 'H', 'H', w)
+(0, ['H'])
+>>> bidirectional_dijkstra((V,dict(E, D = [])), 'D', 'A', w) is None
+True
+
+>>> random.seed(2)
+>>> ok = 0
+>>> for i in xrange(50):
+...   V = list(xrange(30))
+...   w = dict( (u,dict( (v,random.randint(1, 20))
+...                      for v in random.sample(V, 3) )) for u in V )
+...   E = dict( (u,list(vs.keys())) for u, vs in w.items() )
+...   s, t = random.sample(V, 2); d, p = dijkstra((V,E), s, w)
+...   x = bidirectional_dijkstra((V,E), s, t, w)
+...   if x is None: ok += d[t] is None
+...   else: ok += x[0] == d[t] == sum( w[u][v] for u, v in
+...                                    zip(x[1], x[1][1:]) )
+>>> ok
+50
+
                                                                 # }}}2
 
 Bellman-Ford algorithm                                          # {{{2
@@ -156,6 +308,128 @@ d = [('s', 2), ('t', 4), ('x', 6), ('y', 9), ('z', 0)]
 p = [('s', 'z'), ('t', 'x'), ('x', 'y'), ('y', 's'), ('z', None)]
 d = [('s', 2), ('t', 4), ('x', 6), ('y', 9), ('z', 0)]
 p = [('s', 'z'), ('t', 'x'), ('x', 'y'), ('y', 's'), ('z', None)]
+>>> spfa(G, s, w) == (d, p)
+True
+
+>>> V = list(xrange(10))
+>>> E = dict( (u,[u+1] if u < 9 else []) for u in V )
+>>> w = lambda u, v: -1
+>>> passes = []
+>>> d, p = bellman_ford((V,E), 0, w, lambda d, p: passes.append(1),
+...                    early_exit = True)
+>>> len(passes), d[9]
+(2, -9)
+
+>>> V = "abcde"
+>>> w = dict(a = dict(b = 1), b = dict(c = 2), c = dict(d = -4),
+...          d = dict(b = 1, e = 1), e = dict())
+>>> E = dict( (k,sorted(v.keys())) for k,v in w.items() )
+>>> G = (V,E)
+>>> for f in [bellman_ford, spfa]:
+...   try:
+...     f(G, 'a', w)
+...   except NegativeWeightCycle as e:
+...     print(f.__name__, e.cycle)
+bellman_ford ['d', 'b', 'c']
+spfa ['d', 'b', 'c']
+
+>>> random.seed(3)
+>>> ok = 0
+>>> for i in xrange(50):
+...   V = list(xrange(20))
+...   w = dict( (u,dict( (v,random.randint(-5, 20))
+...                      for v in random.sample(V[u+1:], min(3, 19-u)) ))
+...             for u in V )
+...   E = dict( (u,list(vs.keys())) for u, vs in w.items() )
+...   d1, p1 = bellman_ford((V,E), 0, w)
+...   d2, p2 = spfa((V,E), 0, w)
+...   d3, p3 = bellman_ford((V,E), 0, w, early_exit = True)
+...   if d1 == d2 == d3: ok += 1
+>>> ok
+50
+
+                                                                # }}}2
+
+Batched shortest paths                                          # {{{2
+----------------------
+
+>>> V = "ABCDEFGH"
+>>> w = dict(A = dict(B =  5, E =  4),
+...          B = dict(A =  5, C =  6, E =  3, F = 14, G = 10),
+...          C = dict(B =  6, D =  1, G =  9, H = 17),
+...          D = dict(C =  1, H = 12),
+...          E = dict(A =  4, B =  3, F = 11),
+...          F = dict(B = 14, E = 11, G =  7),
+...          G = dict(B = 10, F =  7, H = 15),
+...          H = dict(C = 17, D = 12, G = 15))
+>>> E = dict( (k,sorted(v.keys())) for k,v in w.items() )
+>>> G = (V,E)
+>>> rs = sorted(shortest_paths_many(G, V, w, processes = 2))
+>>> [ s for s, d, p in rs ] == list(V)
+True
+>>> all( (d, p) == dijkstra(G, s, w) for s, d, p in rs )
+True
+>>> rs = shortest_paths_many(G, "AH", w, negative = True,
+...                          processes = 1)
+>>> all( (d, p) == bellman_ford(G, s, w) for s, d, p in rs )
+True
+>>> s, d, p = next(shortest_paths_many(csr_graph(G, w), [0]))
+>>> sorted(d.items())
+[(0, 0), (1, 5), (2, 11), (3, 12), (4, 4), (5, 15), (6, 15), (7, 24)]
+>>> w2 = dict(A = dict(B = 2**60 + 1), B = dict(C = 3), C = dict())
+>>> E2 = dict( (k,list(v)) for k, v in w2.items() )
+>>> rs = shortest_paths_many(("ABC",E2), "A", w2, processes = 2)
+>>> _, d, _ = next(rs)
+>>> d["C"] == 2**60 + 4
+True
+>>> w2["A"]["B"] = 2**70                  # too big for int64
+>>> csr_graph(("ABC",E2), w2).weights == [2**70, 3]
+True
+>>> rs = shortest_paths_many(("ABC",E2), "A", w2, processes = 2)
+>>> next(rs)[1]["C"] == 2**70 + 3
+True
+>>> next(shortest_paths_many(csr_graph(G), [0], processes = 2))
+Traceback (most recent call last):
+  ...
+TypeError: no weights (w is None)
+
+                                                                # }}}2
+
+Shortest-path tree cache                                        # {{{2
+------------------------
+
+>>> w = dict( (u,dict(vs)) for u, vs in w.items() ) # copy
+>>> spt = ShortestPathCache(G, w, maxsize = 2)
+>>> d, p = spt('A'); d['H'], shortest_path(p, 'H')
+(24, ['A', 'B', 'C', 'D', 'H'])
+>>> spt('A')[0] is d
+True
+>>> d_C = spt('C')[0]
+>>> spt.hits, spt.misses, sorted( s for v, s in spt.cache )
+(1, 2, ['A', 'C'])
+>>> spt('H')[0]['A'], sorted( s for v, s in spt.cache ) # evicts A
+(24, ['C', 'H'])
+>>> spt('C')[0] is d_C and spt('A')[0]['H']             # evicts H
+24
+>>> spt.hits, spt.misses, sorted( s for v, s in spt.cache )
+(2, 4, ['A', 'C'])
+>>> spt.set_weight('B', 'E', 5)  # in the tree from C, not from A
+>>> sorted( s for v, s in spt.cache )
+['A']
+>>> spt.set_weight('C', 'D', 2)  # in the tree from A
+>>> sorted( s for v, s in spt.cache ), spt('A')[0]['H']
+([], 25)
+>>> spt.set_weight('G', 'H', 9)  # G -> H is now a shortcut
+>>> sorted( s for v, s in spt.cache ), spt('A')[0]['H']
+([], 24)
+>>> spt.set_weight('G', 'H', 9)  # no change
+>>> sorted( s for v, s in spt.cache )
+['A']
+>>> spt.bump(); spt.version, len(spt)
+(1, 0)
+>>> spt = ShortestPathCache(G, w, maxsize = None, maxbytes = 1)
+>>> spt('A') and spt('B') and len(spt)
+1
 
                                                                 # }}}2
 
@@ -223,6 +497,112 @@ b = 3 path = [('s', 'u', False), ('u', 'v', False), ('v', 'z', False), ('z', 't'
 >>> sorted(cut_a), sorted(cut_b)
 (['s', 'u', 'v', 'x'], ['t', 'y', 'z'])
 
+Dinic's algorithm (on an array-backed residual network):
+
+>>> f2, max_flow2, min_cut2 = dinic(G, s, t, c)
+>>> max_flow2, min_cut2 == min_cut
+(18, True)
+>>> pprint.pprint(f2)
+{'s': {'u': {'capacity': 15, 'flow': 3},
+       'v': {'capacity': 5, 'flow': 5},
+       'x': {'capacity': 12, 'flow': 10}},
+ 't': {},
+ 'u': {'v': {'capacity': 10, 'flow': 3}, 'x': {'capacity': 8, 'flow': 0}},
+ 'v': {'z': {'capacity': 8, 'flow': 8}},
+ 'x': {'t': {'capacity': 5, 'flow': 5}, 'y': {'capacity': 5, 'flow': 5}},
+ 'y': {'t': {'capacity': 15, 'flow': 5}},
+ 'z': {'t': {'capacity': 10, 'flow': 8}}}
+
+>>> def valid_flow(V, f, s, t):
+...   net = dict( (u,0) for u in V )
+...   for u in V:
+...     for v, x in f[u].items():
+...       if not 0 <= x["flow"] <= x["capacity"]: return False
+...       net[u] -= x["flow"]; net[v] += x["flow"]
+...   return all( net[u] == 0 for u in V if u not in (s, t) )
+>>> random.seed(4)
+>>> ok = 0
+>>> for i in xrange(30):
+...   V = list(xrange(12))
+...   c = dict( (u,dict( (v,random.randint(1, 9))
+...                      for v in random.sample(V, 4) if v != u ))
+...             for u in V )
+...   E = dict( (u,list(vs.keys())) for u, vs in c.items() )
+...   f1, m1, cut1 = ford_fulkerson((V,E), 0, 11, c)
+...   f2, m2, cut2 = dinic((V,E), 0, 11, c)
+...   cap = sum( c[u][v] for u in cut2[0] for v in E[u] if v in cut2[1] )
+...   if m1 == m2 == cap and valid_flow(V, f2, 0, 11): ok += 1
+>>> ok
+30
+
+After capacity changes, the flow can be repaired and augmented from
+where it was (instead of starting over):
+
+>>> V = "suvxyzt"
+>>> c = dict(s = dict(u = 15, v = 5, x = 12),
+...          u = dict(x = 8, v = 10),
+...          v = dict(z = 8),
+...          x = dict(y = 5, t = 5),
+...          y = dict(t = 15),
+...          z = dict(t = 10),
+...          t = dict())
+>>> E = dict( (k,sorted(v.keys())) for k,v in c.items() )
+>>> f, max_flow, min_cut = dinic((V,E), 's', 't', c)
+>>> changes = { ('v','z'): 2, ('x','t'): 9 }
+>>> f, max_flow, min_cut = max_flow_update(f, 's', 't', changes)
+>>> max_flow, sorted(min_cut[0])
+(16, ['s', 'u', 'v', 'x'])
+>>> c2 = dict(c, s = dict(c["s"], u = 2**70), u = dict(x = 2**70))
+>>> G2 = (V,dict(E, u = ["x"]))
+>>> dinic(G2, 's', 't', c2)[1] == ford_fulkerson(G2, 's', 't', c2)[1]
+True
+>>> sorted(f["v"]["z"].items()), sorted(f["x"]["t"].items())
+([('capacity', 2), ('flow', 2)], [('capacity', 9), ('flow', 9)])
+>>> c["v"]["z"], c["x"]["t"] = 2, 9
+>>> dinic((V,E), 's', 't', c)[1]
+16
+
+>>> N = FlowNetwork((V,E), c); N.max_flow('s', 't')
+16
+>>> N.update('s', 't', { ('s','x'): 4 }), N.value('s')
+(-2, 14)
+>>> N.update('s', 't', { ('s','x'): 12, ('v','z'): 8 }), N.value('s')
+(8, 22)
+>>> N.update('s', 't', { ('s','x'): 2, ('s','t'): 1 })
+Traceback (most recent call last):
+  ...
+KeyError: ('s', 't')
+>>> N.update('s', 't', { ('s','x'): 2, ('v','z'): -1 })
+Traceback (most recent call last):
+  ...
+ValueError: negative capacity
+>>> N.value('s'), sorted(N.flows()['s']['x'].items())
+(22, [('capacity', 12), ('flow', 6)])
+>>> f = N.flows(); f['u']['v']['flow'] += 1
+>>> max_flow_update(f, 's', 't', {})
+Traceback (most recent call last):
+  ...
+ValueError: invalid flow (not conserved)
+
+>>> random.seed(5)
+>>> ok = 0
+>>> for i in xrange(30):
+...   V = list(xrange(12))
+...   c = dict( (u,dict( (v,random.randint(1, 9))
+...                      for v in random.sample(V, 4) if v != u ))
+...             for u in V )
+...   E = dict( (u,list(vs.keys())) for u, vs in c.items() )
+...   f, m, cut = dinic((V,E), 0, 11, c)
+...   changes = dict( ((u,v),random.randint(0, 9)) for u in V
+...                   for v in E[u] if random.random() < 0.3 )
+...   f, m, cut = max_flow_update(f, 0, 11, changes)
+...   for (u, v), x in changes.items(): c[u][v] = x
+...   a, b = cut; cap = sum( c[u][v] for u in a for v in E[u] if v in b )
+...   if m == dinic((V,E), 0, 11, c)[1] == cap and \
+...      valid_flow(V, f, 0, 11): ok += 1
+>>> ok
+30
+
                                                                 # }}}2
 
 Universal sink (celebrity problem)                              # {{{2
@@ -241,6 +621,64 @@ True
 
                                                                 # }}}2
 
+Compact (CSR) graphs                                            # {{{2
+--------------------
+
+>>> V = "ABCDE"
+>>> w = dict(A = dict(B = 4, C = 1), B = dict(D = 1),
+...          C = dict(B = 2, D = 5), D = dict(E = 3), E = dict())
+>>> E = dict( (k,sorted(v.keys())) for k,v in w.items() )
+>>> C = csr_graph((V,E), w)
+>>> len(C), C.offsets.tolist(), C.targets.tolist()
+(5, [0, 2, 3, 5, 6, 6], [1, 2, 3, 1, 3, 4])
+>>> C.weights.tolist()
+[4, 1, 1, 2, 5, 3]
+>>> C.neighbors(2).tolist(), C.weight(2, 3)
+([1, 3], 5)
+>>> d, p = dijkstra(C, 0, None)
+>>> [ (C.labels[u], d[u]) for u in sorted(d) ]
+[('A', 0), ('B', 3), ('C', 1), ('D', 4), ('E', 7)]
+>>> csr_graph((V,E), lambda u, v: w[u][v] / 2.0).weights.tolist()
+[2.0, 0.5, 0.5, 1.0, 2.5, 1.5]
+>>> d, p = bellman_ford(C, 0, None)
+>>> [ (C.labels[u], C.labels[v] if v is not None else None)
+...   for u, v in sorted(p.items()) ]
+[('A', None), ('B', 'C'), ('C', 'A'), ('D', 'B'), ('E', 'D')]
+>>> [ C.labels[u] for u in topological_sort(C) ]
+['A', 'C', 'B', 'D', 'E']
+>>> CT = transpose(C)
+>>> [ (CT.labels[u], [ CT.labels[v] for v in CT.neighbors(u) ])
+...   for u in xrange(len(CT)) ]
+[('A', []), ('B', ['A', 'C']), ('C', ['A']), ('D', ['B', 'C']), ('E', ['D'])]
+>>> CT.weight(1, 2)
+2
+
+>>> V = "ABCDEFGH"
+>>> E = dict(A = "B", B = "CEF", C = "DG", D = "CH", E = "AF",
+...          F = "G", G = "FH" , H = "H")
+>>> C = csr_graph((V,E))
+>>> SCC_V, SCC_E = strongly_connected_components(C)
+>>> [ "".join( C.labels[u] for u in t ) for t in SCC_V ]
+['ABE', 'CD', 'FG', 'H']
+
+>>> V = "suvxyzt"
+>>> c = dict(s = dict(u = 15, v = 5, x = 12),
+...          u = dict(x = 8, v = 10),
+...          v = dict(z = 8),
+...          x = dict(y = 5, t = 5),
+...          y = dict(t = 15),
+...          z = dict(t = 10),
+...          t = dict())
+>>> E = dict( (k,sorted(v.keys())) for k,v in c.items() )
+>>> C = csr_graph((V,E), c); I = C.index()
+>>> f, max_flow, (cut_a, cut_b) = ford_fulkerson(C, I["s"], I["t"], None)
+>>> max_flow
+18
+>>> sorted( C.labels[u] for u in cut_a )
+['s', 'u', 'v', 'x']
+
+                                                                # }}}2
+
 Miscellaneous graph algorithms                                  # {{{2
 ------------------------------
 
@@ -259,27 +697,65 @@ L 152
   -> T 295
 M 231
   -> D 347
-  -> L 292
 T 295
   -> A 435
-  -> L 374
 D 347
   -> C 456
-  -> M 381
 A 435
   -> S 456
-  -> T 531
   -> Z 491
-C 456
-  -> D 587
-  -> P 483
-  -> R 489
 S 456
-  -> A 715
   -> F 468
   -> O 711
   -> R 527
+C 456
+  -> P 483
+  -> R 489
 ('F', 468)
+>>> a_star(A, B, h, siblings, with_path = True)
+('F', 468, ['L', 'T', 'A', 'S', 'F'])
+>>> a_star(A, B, h, siblings, dary = 2, with_path = True)
+('F', 468, ['L', 'T', 'A', 'S', 'F'])
+
+Memory-bounded variants:
+
+>>> ida_star(A, B, h, siblings)
+('F', 468, ['L', 'T', 'A', 'S', 'F'])
+>>> beam_search(A, B, h, siblings, 5)
+('F', 468, ['L', 'T', 'A', 'S', 'F'])
+>>> beam_search(A, B, h, siblings, 1)   # not optimal
+('F', 679, ['L', 'M', 'D', 'C', 'P', 'R', 'S', 'F'])
+>>> beam_search(A, B, h, siblings, 1, max_depth = 6) is None
+True
+>>> h_X = lambda node: 0
+>>> a_star(A, "X", h_X, siblings), ida_star(A, "X", h_X, siblings)
+(None, None)
+>>> beam_search(A, "X", h_X, siblings, 3) is None
+True
+
+Landmark (ALT) heuristics need no coordinates, just preprocessing:
+
+>>> V = sorted(EX_DISTANCES)
+>>> E = dict( (u,sorted(vs)) for u, vs in EX_DISTANCES.items() )
+>>> G = (V,E); lm = landmarks(G, EX_DISTANCES, k = 3)
+>>> [ V[i] for i in lm.landmarks ]
+['N', 'E', 'D']
+>>> h_alt = lm.heuristic(B); d = dijkstra(G, B, EX_DISTANCES)[0]
+>>> all( 0 <= h_alt(u) <= d[u] for u in V )             # admissible
+True
+>>> sum( h_alt(u) for u in V ) > sum( h_X(u) for u in V )
+True
+>>> a_star(A, B, h_alt, siblings, with_path = True)
+('F', 468, ['L', 'T', 'A', 'S', 'F'])
+
+>>> import os, tempfile
+>>> fd, path = tempfile.mkstemp(); os.close(fd)
+>>> lm.save(path); lm2 = load_landmarks(path, G); os.remove(path)
+>>> lm2.landmarks == lm.landmarks and lm2.dfrom == lm.dfrom \
+...                               and lm2.dto   == lm.dto
+True
+>>> all( lm2.heuristic(B)(u) == h_alt(u) for u in V )
+True
 
                                                                 # }}}2
 
@@ -414,6 +890,56 @@ minimax(0, 1)
                'value': 0.5}],
  'value': 0.5}
 
+Nim (take 1-3 stones; whoever takes the last one wins), w/
+transpositions:
+
+>>> leaf  = lambda x: x[0] == 0
+>>> value = lambda x: 0 if x[1] else 1
+>>> moves = lambda x: [ (x[0]-k, not x[1]) for k in (1,2,3)
+...                       if k <= x[0] ]
+>>> nim   = lambda n: (n, True)   # (stones, max to move)
+>>> n = [0]
+>>> def count(x): n[0] += 1; return leaf(x)
+>>> nop = lambda x, v: None
+>>> minimax_alphabeta(nim(15), 0, 1, count, value, moves, nop), n[0]
+(1, 3200)
+>>> stats = {}
+>>> minimax_search(nim(15), 0, 1, lambda x: x, leaf, value, moves,
+...                stats = stats), stats["nodes"]
+(1, 53)
+>>> [ minimax_search(nim(i), 0, 1, lambda x: x, leaf, value, moves,
+...                  depth = i) for i in range(1, 10) ]
+[1, 1, 1, 0, 1, 1, 1, 0, 1]
+>>> minimax_search(nim(9), 0, 1, lambda x: x, leaf, value, moves,
+...                depth = 0, evaluate = lambda x: 0.5)
+0.5
+
+>>> tt = TranspositionTable(64)
+>>> minimax_search(nim(20), 0, 1, lambda x: x, leaf, value, moves,
+...                tt = tt)
+0
+>>> tt.get(nim(20))[1:4] == (float("inf"), TranspositionTable.UPPER, 0)
+True
+>>> t1, t2 = TranspositionTable(1), TranspositionTable(1, "always")
+>>> for t in (t1, t2):
+...   t.put("a", 3, TranspositionTable.EXACT, 1)
+...   t.put("b", 2, TranspositionTable.EXACT, 0)
+>>> t1.get("a")[:2], t1.get("b"), t2.get("a"), t2.get("b")[:2]
+(('a', 3), None, None, ('b', 2))
+
+In parallel:
+
+>>> minimax_parallel(nim(15), 0, 1, leaf, value, moves, processes = 2)
+1
+>>> [ minimax_parallel(nim(i), 0, 1, leaf, value, moves, processes = 2)
+...   for i in (4, 9, 12) ]
+[0, 1, 0]
+>>> T = dict(value = None, children = L1)
+>>> minimax_parallel(T, 0, 1, start_max = False, processes = 2)
+0.5
+>>> minimax_parallel(T, 0, 1, start_max = False, processes = 1)
+0.5
+
                                                                 # }}}2
 
 d-ary heap                                                      # {{{2
@@ -461,6 +987,102 @@ d-ary heap                                                      # {{{2
 >>> A
 [99, 42, 30, 22, 29, 27, 24, 23, 28, 7]
 
+>>> q = IndexedHeap(3)
+>>> for x, k in zip("ABCDE", [5, 3, 8, 1, 9]): q.push(x, k)
+>>> q.decrease_key("E", 2); q["E"], "C" in q, len(q)
+(2, True, 5)
+>>> [ q.pop_min() for _ in xrange(len(q)) ]
+[(1, 'D'), (2, 'E'), (3, 'B'), (5, 'A'), (8, 'C')]
+>>> q.pop_min()
+Traceback (most recent call last):
+  ...
+IndexError: heap underflow
+
+>>> h = DaryHeap([24,21,23,22,36,29,30,34,28,27], 4)
+>>> h.peek(), h.pop(), h.pushpop(1), h.pushpop(25), h.replace(40)
+(21, 21, 1, 22, 23)
+>>> h.decrease_key(h.items.index(40), 20); h.peek()
+20
+>>> h.remove(h.items.index(29)), [ h.pop() for _ in xrange(len(h)) ]
+(29, [20, 24, 25, 27, 28, 30, 34, 36])
+>>> heap_increase_key(3, [3, 2, 1], 1, 0)
+Traceback (most recent call last):
+  ...
+ValueError: new key less than current key
+>>> heapsort(2, (3, 1, 2))
+Traceback (most recent call last):
+  ...
+TypeError: 'tuple' object does not support item assignment
+>>> sorted(DaryHeap((3, 1, 2)).items)   # DaryHeap copies it
+[1, 2, 3]
+
+>>> n = [0]
+>>> def length(x): n[0] += 1; return len(x)
+>>> h = DaryHeap("abc d efgh ij".split(), 3, maxheap = True,
+...              key = length)
+>>> h.push("klmno"); h.pushpop("p")
+'klmno'
+>>> [ h.pop() for _ in xrange(len(h)) ], n[0]
+(['efgh', 'abc', 'ij', 'd', 'p'], 6)
+
+>>> h = DaryHeap([0.5, 2.5, 1.5], typecode = "d"); h.push(-1)
+>>> h.items
+array('d', [-1.0, 0.5, 1.5, 2.5])
+>>> h.sort(), len(h)
+(array('d', [2.5, 1.5, 0.5, -1.0]), 0)
+
+>>> r = heap_benchmark(ds = (2, 4), sizes = (10, 200), keys = ("int",),
+...                    workloads = ("sort",), repeat = 1)
+... # doctest: +ELLIPSIS
+workload       key        size      d=2      d=4  best
+sort           int          10 ...
+sort           int         200 ...
+>>> sorted(r), sorted(r[("sort", "int", 200)])
+([('sort', 'int', 10), ('sort', 'int', 200)], [2, 4])
+>>> _HEAP_BEST_D[("sort", "int", 3)] in (2, 4)
+True
+>>> random.seed(6)
+>>> A = [ random.random() for _ in xrange(1000) ]
+>>> heapsort("auto", A, copy = True) == sorted(A)
+True
+>>> build_maxheap("auto", A); A[0] == max(A)
+True
+
+In place on (typed views of) buffers, and indirectly:
+
+>>> A = array("d", [2.5, -1.0, 3.0, 0.5])
+>>> V = memoryview(A) if hasattr(memoryview, "cast") else A  # >= 3.3
+>>> heapsort(3, V, copy = True).tolist(), A.tolist()
+([-1.0, 0.5, 2.5, 3.0], [2.5, -1.0, 3.0, 0.5])
+>>> heapsort(3, V); A.tolist()
+[-1.0, 0.5, 2.5, 3.0]
+>>> M = mmap.mmap(-1, 5); M[:] = b"heap!"
+>>> heapsort(2, M, copy = True) == bytearray(b"!aehp"), M[:] == b"heap!"
+(True, True)
+>>> heapsort(2, M); M[:] == b"!aehp"
+True
+>>> R = [ ("bob", 42), ("alice", 37), ("eve", 99), ("carol", 7) ]
+>>> p = heapsort_indices(2, R, key = lambda r: r[1]); p.tolist()
+[3, 1, 0, 2]
+>>> [ R[i][0] for i in p ]
+['carol', 'alice', 'bob', 'eve']
+
+Streaming top-k and partial sort:
+
+>>> stream = ( (i * 7919) % 1009 for i in xrange(10**5) )
+>>> nlargest(5, stream, d = 4)
+[1008, 1008, 1008, 1008, 1008]
+>>> words = "the quick brown fox jumps over the lazy dog".split()
+>>> nlargest(3, iter(words), key = len), nsmallest(3, words, key = len)
+(['quick', 'brown', 'jumps'], ['the', 'fox', 'the'])
+>>> nsmallest(0, words), nsmallest(20, words) == sorted(words)
+([], True)
+>>> A = [24,21,23,22,36,29,30,34,28,27]
+>>> partial_sort(3, A, 4); A[:4], sorted(A[4:])
+([21, 22, 23, 24], [27, 28, 29, 30, 34, 36])
+>>> partial_sort(2, words, 2, key = len, reverse = True); words[:2]
+['quick', 'brown']
+
                                                                 # }}}2
 
 Extended Euclidean algorithm                                    # {{{2
@@ -516,6 +1138,32 @@ Prime Numbers (Sieve of Eratosthenes)                           # {{{2
 
 >>> list(primes_up_to(100))
 [2, 3, 5, 7, 11, 13, 17, 19, 23, 29, 31, 37, 41, 43, 47, 53, 59, 61, 67, 71, 73, 79, 83, 89, 97]
+>>> list(segmented_sieve(100, 150)), list(segmented_sieve(0, 3))
+([101, 103, 107, 109, 113, 127, 131, 137, 139, 149], [2])
+>>> list(itertools.islice(segmented_sieve(10**12), 3))
+[1000000000039, 1000000000061, 1000000000063]
+>>> A = primes_array(10**6); len(A), A[-1]
+(78498, 999983)
+>>> B = list(primes_up_to(20000, lprimes))
+>>> all( list(segmented_sieve(lo, hi, 8)) ==
+...      [ p for p in B if lo <= p < hi ] for lo, hi in
+...      [(0, 20000), (7, 7), (29, 31), (31, 61), (997, 19997)] )
+True
+
+>>> import os, tempfile
+>>> fd, path = tempfile.mkstemp(); os.close(fd)
+>>> save_prime_table(path, 10**5); os.path.getsize(path)
+76752
+>>> T = load_prime_table(path); len(T), T[0], T[-1]
+(9592, 2, 99991)
+>>> use_prime_table(path); os.remove(path)
+>>> list(itertools.islice(mprimes(), 9590, 9595))
+[99989, 99991, 100003, 100019, 100043]
+>>> list(primes_up_to(99990))[-1], list(primes_up_to(100030))[-3:]
+(99989, [99991, 100003, 100019])
+>>> list(prime_factors(99991 * 100003))
+[99991, 100003]
+>>> use_prime_table(None)
 
 >>> list(prime_factors(1))
 []
@@ -525,6 +1173,39 @@ Prime Numbers (Sieve of Eratosthenes)                           # {{{2
 [2, 2, 5, 5]
 >>> list(prime_factors(982139867123097))
 [3, 162629, 2013047831]
+>>> list(prime_factors(2147483647 * 4294967291))
+[2147483647, 4294967291]
+>>> p, q = 2**31 - 1, 2**61 - 1
+>>> list(prime_factors(p * q * 3**2)) == [3, 3, p, q]
+True
+>>> [ is_prime(n) for n in (0, 1, 2, 561, 2047, 3215031751,
+...                         2**61 - 1, 18446744073709551557,
+...                         2**89 - 1, 2**89 + 1) ]
+[False, False, True, False, False, False, True, True, True, False]
+>>> n = 318665857834031151167461    # psp(2..37)
+>>> is_prime(n), n == 399165290221 * 798330580441
+(False, True)
+>>> all( is_prime(n) == (n in P) for P in [set(primes_array(10**4))]
+...      for n in xrange(10**4) )
+True
+
+>>> T = SPFTable(100); list(T.factor(84)), T.factorize(84)
+([2, 2, 3, 7], [(2, 2), (3, 1), (7, 1)])
+>>> list(T.factor_many([1, 97, 99]))
+[[], [97], [3, 3, 11]]
+>>> T.totients()[:13].tolist()
+[0, 1, 1, 2, 2, 4, 2, 6, 4, 6, 4, 10, 4]
+>>> T.mobius()[:13].tolist()
+[0, 1, -1, -1, 0, -1, 1, -1, 0, 0, 1, -1, 0]
+>>> T.divisor_counts()[:13].tolist()
+[0, 1, 2, 2, 3, 2, 4, 2, 4, 3, 4, 2, 6]
+>>> T.divisor_sums()[:13].tolist()
+[0, 1, 3, 4, 7, 6, 12, 8, 15, 13, 18, 12, 28]
+>>> T = use_spf_table(10**5)
+>>> all( list(prime_factors(m)) == list(prime_factors(m, mprimes()))
+...      for m in xrange(1, 10**5 + 1000, 7) )
+True
+>>> _ = use_spf_table(None)
 
 >>> divisors(1)
 [1]
@@ -588,6 +1269,20 @@ Everything seems to be thread-safe:
 >>> a == list(primes_up_to(100000)) and a == b and b == c
 True
 
+>>> sieve   = _make_prime_sieve() # new data!
+>>> xs      = [ [] for _ in xrange(8) ]
+>>> def g(x): x.extend(itertools.islice(sieve(), 200000))
+>>> ts      = [ threading.Thread(target = g, args = (x,)) for x in xs ]
+>>> for t in ts: t.start()
+>>> for t in ts: t.join()
+>>> all( x == xs[0] for x in xs ), xs[0] == list(primes_array(2750159))
+(True, True)
+>>> list(_make_prime_sieve(iter([2, 3, 5, 7, 11]), batch = 2)())
+[2, 3, 5, 7, 11]
+>>> list(_make_prime_sieve(iter([2, 3, 5, 7, 11, 13]),
+...                        table = array(_U64, [2, 3, 5]))())
+[2, 3, 5, 7, 11, 13]
+
 >>> primes  = llist(erastothenes()) # new data!
 >>> a, b, c = [], [], []
 >>> def f(x):
@@ -611,24 +1306,38 @@ Links
 
 https://en.wikipedia.org/wiki/A*_search_algorithm
 https://en.wikipedia.org/wiki/Alpha%E2%80%93beta_pruning
+https://en.wikipedia.org/wiki/Beam_search
 https://en.wikipedia.org/wiki/Bellman%E2%80%93Ford_algorithm
+https://en.wikipedia.org/wiki/Bidirectional_search
+https://en.wikipedia.org/wiki/Critical_path_method
 https://en.wikipedia.org/wiki/D-ary_heap
 https://en.wikipedia.org/wiki/Depth-first_search
 https://en.wikipedia.org/wiki/Dijkstra%27s_algorithm
+https://en.wikipedia.org/wiki/Dinic%27s_algorithm
 https://en.wikipedia.org/wiki/Extended_Euclidean_algorithm
 https://en.wikipedia.org/wiki/Ford%E2%80%93Fulkerson_algorithm
 https://en.wikipedia.org/wiki/Heapsort
+https://en.wikipedia.org/wiki/Iterative_deepening_A*
+https://en.wikipedia.org/wiki/Miller%E2%80%93Rabin_primality_test
 https://en.wikipedia.org/wiki/Minimax
+https://en.wikipedia.org/wiki/Pollard%27s_rho_algorithm
+https://en.wikipedia.org/wiki/Shortest_Path_Faster_Algorithm
 https://en.wikipedia.org/wiki/Sieve_of_Eratosthenes
+https://en.wikipedia.org/wiki/Sparse_matrix#Compressed_sparse_row_.28CSR.2C_CRS_or_Yale_format.29
 https://en.wikipedia.org/wiki/Strongly_connected_component
+https://en.wikipedia.org/wiki/Tarjan%27s_strongly_connected_components_algorithm
 https://en.wikipedia.org/wiki/Topological_sorting
+https://en.wikipedia.org/wiki/Wheel_factorization
 """
                                                                 # }}}1
 
 from __future__ import print_function
 
-import argparse, functools, itertools, heapq, operator, sys, threading
-from collections import deque
+import argparse, bisect, functools, itertools, heapq, mmap, \
+       multiprocessing, operator, random, struct, sys, threading, \
+       timeit
+from array import array
+from collections import deque, OrderedDict
 
 if sys.version_info.major == 2:                                 # {{{1
   izip    = itertools.izip
@@ -636,6 +1345,21 @@ else:
   izip    = zip
   xrange  = range
   reduce  = functools.reduce
+
+try:
+  array("q"); _I64, _U64 = "q", "Q"
+except ValueError:                                              # python 2
+  _I64 = _U64 = "l"                                         # (items: int)
+
+try:
+  from multiprocessing import shared_memory
+except ImportError:                                             # < 3.8
+  shared_memory = None
+
+try:
+  from math import gcd
+except ImportError:                                             # < 3.5
+  from fractions import gcd
                                                                 # }}}1
 
 __version__       = "0.0.3"
@@ -643,6 +1367,7 @@ __version__       = "0.0.3"
 
 def main(*args):                                                # {{{1
   p = _argument_parser(); n = p.parse_args(args)
+  if n.bench: heap_benchmark(); return 0
   import doctest
   failures, tests = doctest.testmod(verbose = n.verbose)
   return 0 if failures == 0 else 1
@@ -654,6 +1379,8 @@ def _argument_parser():                                         # {{{1
                  version = "%(prog)s {}".format(__version__))
   p.add_argument("--verbose", "-v", action = "store_true",
                  help = "run tests verbosely")
+  p.add_argument("--bench", action = "store_true",
+                 help = "run heap benchmarks (instead of tests)")
   return p
                                                                 # }}}1
 
@@ -661,28 +1388,66 @@ def _argument_parser():                                         # {{{1
 
 def dfs(G, neighbors  = None, at_discover = None,               # {{{1
            at_edge    = None, at_finish   = None):
-  """Perform DFS on a graph."""
-  V, E = G; colour, p, d, f = {}, {}, {}, {}; ts = []
-  _ = type("",(),{})(); _.time = 0
+  """Perform DFS on a graph (non-recursive; see dfs_events)."""
+  V, E = G; colour, p, d, f = {}, {}, {}, {}; ts = []; time = 0
   if neighbors is None: neighbors = lambda u: E[u]
-  def visit(u, t):
-    t.append(u)
-    if at_discover: at_discover(u)
-    colour[u] = 'G'; _.time += 1; d[u] = _.time
-    for v in neighbors(u):
-      if at_edge: at_edge(u, v, colour[v])
-      if colour[v] == 'W':
-        p[v] = u; visit(v, t)   # recursive!
-    colour[u] = 'B'; _.time += 1; f[u] = _.time
-    if at_finish: at_finish(u)
   for u in V:
     colour[u], p[u] = 'W', None
-  for u in V:
-    if colour[u] == 'W':
-      t = []; visit(u, t); ts.append(t)
+  for s in V:
+    if colour[s] != 'W': continue
+    t = [s]; ts.append(t)
+    if at_discover: at_discover(s)
+    colour[s] = 'G'; time += 1; d[s] = time
+    stack = [(s, iter(neighbors(s)))]
+    while stack:
+      u, vs = stack[-1]
+      for v in vs:
+        c = colour[v]
+        if at_edge: at_edge(u, v, c)
+        if c == 'W':
+          p[v] = u; t.append(v)
+          if at_discover: at_discover(v)
+          colour[v] = 'G'; time += 1; d[v] = time
+          stack.append((v, iter(neighbors(v)))); break
+      else:
+        stack.pop(); colour[u] = 'B'; time += 1; f[u] = time
+        if at_finish: at_finish(u)
   return p, ts, d, f
                                                                 # }}}1
 
+def dfs_events(G, neighbors = None):
+  """Perform DFS on a graph, lazily generating (event, u, v) tuples:
+  ("discover", u, parent), ("finish", u, parent) and, for each edge,
+  (kind, u, v) with kind one of "tree", "back", "forward", "cross"."""
+  return _dfs(G, neighbors, {}, {}, {})
+
+def _dfs(G, neighbors, p, d, f):                                # {{{1
+  """Non-recursive DFS (generator); fills p, d & f."""
+  V, E = G; colour = {}; time = 0
+  if neighbors is None: neighbors = lambda u: E[u]
+  for u in V:
+    colour[u], p[u] = 'W', None
+  for s in V:
+    if colour[s] != 'W': continue
+    colour[s] = 'G'; time += 1; d[s] = time
+    yield "discover", s, None
+    stack = [(s, iter(neighbors(s)))]
+    while stack:
+      u, vs = stack[-1]
+      for v in vs:
+        c = colour[v]
+        if c == 'W':
+          yield "tree", u, v
+          colour[v] = 'G'; p[v] = u; time += 1; d[v] = time
+          yield "discover", v, u
+          stack.append((v, iter(neighbors(v)))); break
+        elif c == 'G': yield "back", u, v
+        else: yield ("forward" if d[u] < d[v] else "cross"), u, v
+      else:
+        stack.pop(); colour[u] = 'B'; time += 1; f[u] = time
+        yield "finish", u, p[u]
+                                                                # }}}1
+
 # === Topological sort and longest path ===
 
 def topological_sort(G):
@@ -707,88 +1472,473 @@ def topological_sort2(G):                                       # {{{1
 
 def longest_path(G):
   """Find the length of the longest path in a DAG."""
-  V, E = G; lens = {}; ET = transpose(G)[1]; V_ = topological_sort(G)
-  for u in V_:
-    vs      = [ lens[v] for v in ET[u] ]
-    lens[u] = max( vs ) + 1 if vs else 0
-  return max(lens.values())
+  return critical_path(G)[0]
+
+def critical_path(G, w = None, duration = None):                # {{{1
+  """Critical path of a DAG w/ edge weights w and/or vertex weights
+  duration (dicts or functions; w/o either, every edge has weight 1);
+  a single pass over a Kahn ordering.  Returns (length, path,
+  earliest, latest) w/ earliest[i] and latest[i] the earliest and
+  latest start times of the i-th vertex of V."""
+  if isinstance(w, dict): w_, w = w, lambda u, v: w_[u][v]
+  if isinstance(duration, dict): duration = duration.__getitem__
+  C = G if isinstance(G, CSRGraph) else csr_graph(G)
+  L, n, o, ts = list(G[0]), len(C), C.offsets, C.targets
+  if w is not None:
+    ew = _num_array( w(L[u], L[ts[i]]) for u in xrange(n)
+                                       for i in xrange(o[u], o[u+1]) )
+  elif C.weights is not None: ew = C.weights
+  else: ew = array("i", [0 if duration else 1])*len(ts)
+  dur = _num_array( duration(u) for u in L ) if duration \
+        else array("i", [0])*n
+  z   = 0.0 if "d" in ( getattr(a, "typecode", None)
+                        for a in (ew, dur) ) else 0
+  indeg = array("i", [0])*n; pred = array("i", [-1])*n
+  for v in ts: indeg[v] += 1
+  order = array("i", ( u for u in xrange(n) if indeg[u] == 0 ))
+  es    = [z]*n; k = 0
+  while k < len(order):
+    u = order[k]; k += 1; x = es[u] + dur[u]
+    for i in xrange(o[u], o[u+1]):
+      v = ts[i]; indeg[v] -= 1
+      if x + ew[i] > es[v] or pred[v] < 0:
+        es[v] = x + ew[i]; pred[v] = u
+      if indeg[v] == 0: order.append(v)
+  if len(order) < n:                  # follow left-over in-edges
+    prev = array("i", [-1])*n; seen = {}; walk = []
+    for u in xrange(n):
+      for i in xrange(o[u], o[u+1]):
+        if indeg[u] and indeg[ts[i]]: prev[ts[i]] = u
+    u = next( u for u in xrange(n) if indeg[u] )
+    while u not in seen:
+      seen[u] = len(walk); walk.append(u); u = prev[u]
+    raise DirectedCycle([ L[v] for v in reversed(walk[seen[u]:]) ])
+  length, end = es[0] if n else 0, None
+  for u in xrange(n):
+    x = es[u] + dur[u]
+    if end is None or x > length: length, end = x, u
+  ls    = [z]*n
+  for u in reversed(order):
+    x = length
+    for i in xrange(o[u], o[u+1]): x = min(x, ls[ts[i]] - ew[i])
+    ls[u] = x - dur[u]
+  path  = []
+  while end is not None and end >= 0:
+    path.append(L[end]); end = pred[end]
+  path.reverse()
+  return length, path, _num_array(es), _num_array(ls)
+                                                                # }}}1
+
+class DirectedCycle(Exception):
+  """Directed cycle (the vertices of which are in .cycle)."""
+  def __init__(self, cycle = None):
+    super(DirectedCycle, self).__init__(cycle); self.cycle = cycle
+
+class DynamicDAG(object):                                       # {{{1
+  """DAG w/ a topological order maintained under edge insertions and
+  deletions (Pearce-Kelly algorithm): inserting edge (u,v) only
+  reorders the vertices between v and u in the current order, and
+  raises DirectedCycle if the edge would create a cycle.
+
+  Initialised w/ graph G, the order is the one topological_sort2(G)
+  produces; after updates, it is a (not necessarily identical) valid
+  topological order of the resulting graph."""
+  __slots__ = "E ET ord vs".split()
+  def __init__(self, G = None):
+    self.E, self.ET, self.ord, self.vs = {}, {}, {}, []
+    if G is None: return
+    V, E = G; vs = topological_sort2(G); ok = len(vs) == len(V)
+    for u in vs: self.add_vertex(u)
+    for u in V: self.add_vertex(u)
+    for u in V:
+      for v in E[u]:
+        if ok: self.E[u].append(v); self.ET[v].append(u)
+        else:  self.add_edge(u, v)    # raises DirectedCycle
+  def __len__(self): return len(self.vs)
+  def __contains__(self, u): return u in self.ord
+  def order(self):
+    """Current topological order."""
+    return list(self.vs)
+  def add_vertex(self, u):
+    """Add vertex u (at the end of the order) unless present."""
+    if u in self.ord: return
+    self.ord[u] = len(self.vs); self.vs.append(u)
+    self.E[u], self.ET[u] = [], []
+  def add_edge(self, u, v):
+    """Add edge (u,v), reordering as needed."""
+    self.add_vertex(u); self.add_vertex(v)
+    if v in self.E[u]: return
+    lb, ub = self.ord[v], self.ord[u]
+    if lb <= ub:
+      F = self._search(v, self.E, lambda x: x <= ub, u)
+      B = self._search(u, self.ET, lambda x: x > lb)
+      self._reorder(F, B)
+    self.E[u].append(v); self.ET[v].append(u)
+  def remove_edge(self, u, v):
+    """Remove edge (u,v); the order remains valid."""
+    self.E[u].remove(v); self.ET[v].remove(u)
+  def _search(self, s, E, ok, target = None):
+    """Vertices reachable from s via E w/ ok(ord) (DFS); raises
+    DirectedCycle if target is reached."""
+    ord = self.ord; seen = { s: None }; stack = [s]
+    while stack:
+      u = stack.pop()
+      if u == target:
+        cycle = []
+        while u is not None: cycle.append(u); u = seen[u]
+        cycle.reverse(); raise DirectedCycle(cycle[-1:] + cycle[:-1])
+      for v in E[u]:
+        if v not in seen and ok(ord[v]): seen[v] = u; stack.append(v)
+    return seen
+  def _reorder(self, F, B):
+    """Move B (the affected ancestors) before F (the descendants),
+    reusing their positions."""
+    ord, vs = self.ord, self.vs; key = lambda u: ord[u]
+    L = sorted(B, key = key) + sorted(F, key = key)
+    for i, u in izip(sorted( ord[u] for u in L ), L):
+      ord[u] = i; vs[i] = u
+                                                                # }}}1
 
 # === Strongly connected components ===
 
 def strongly_connected_components(G):                           # {{{1
-  """Find the strongly connected componens of a graph."""
-  V, E    = G; ET = transpose(G)[1]; V_ = deque()
-  dfs(G, at_finish = lambda u: V_.appendleft(u)); ts = dfs((V_,ET))[1]
-  ts_     = [ tuple(sorted(set(t))) for t in ts ]
+  """Find the strongly connected componens of a graph (as sorted
+  tuples or strings, and the edges between them; see scc_tarjan for
+  compact output)."""
+  V       = list(G[0]); comp, C = scc_tarjan(G)
+  ts      = [ [] for c in xrange(len(C)) ]
+  for u, c in izip(V, comp): ts[c].append(u)
+  ts_     = [ tuple(sorted(t)) for t in ts ]
   if all( isinstance(x, str) and len(x) == 1 for x in V ):
     ts_   = [ "".join(t) for t in ts_ ]
-  comp    = dict( (u,t) for t in ts_ for u in t )
-  SCC_E   = dict( (t,list(set([ comp[v] for u in t for v in E[u]
-                                        if comp[v] != t ])))
-                  for t in ts_ )
+  SCC_E   = dict( (ts_[c],[ ts_[c_] for c_ in C.neighbors(c) ])
+                  for c in xrange(len(C)) )
   return (ts_, SCC_E)
                                                                 # }}}1
 
+def scc_tarjan(G):                                              # {{{1
+  """Strongly connected components using (non-recursive) Tarjan's
+  algorithm; returns (comp, C), where comp[i] is the component of
+  the i-th vertex of V (numbered in topological order) and C is the
+  condensation (a CSRGraph w/o duplicate edges)."""
+  if not isinstance(G, CSRGraph): G = csr_graph(G)
+  n, o, ts  = len(G), G.offsets, G.targets
+  index     = array("i", [-1])*n; low = array("i", [0])*n
+  comp      = array("i", [-1])*n; it  = array(_I64, o)
+  stack, calls, i, k = [], [], 0, 0
+  for r in xrange(n):
+    if index[r] >= 0: continue
+    index[r] = low[r] = i; i += 1; stack.append(r); calls.append(r)
+    while calls:
+      u = calls[-1]; j = it[u]; end = o[u+1]
+      while j < end:
+        v = ts[j]; j += 1
+        if index[v] < 0: break
+        if comp[v] < 0 and index[v] < low[u]: low[u] = index[v]
+      else: v = None
+      it[u] = j
+      if v is not None:     # "recursive call"
+        index[v] = low[v] = i; i += 1; stack.append(v); calls.append(v)
+        continue
+      calls.pop()
+      if low[u] == index[u]:
+        while True:
+          v = stack.pop(); comp[v] = k
+          if v == u: break
+        k += 1
+      if calls and low[u] < low[calls[-1]]: low[calls[-1]] = low[u]
+  for u in xrange(n): comp[u] = k-1 - comp[u]  # topological order
+  return comp, _condensation(G, comp, k)
+                                                                # }}}1
+
+def _condensation(G, comp, k):                                  # {{{1
+  """Condensation (w/o duplicate edges) of CSRGraph G given comp."""
+  o, ts   = G.offsets, G.targets; n = len(G)
+  first   = array(_I64, [0])*(k+1); order = array("i", [0])*n
+  for c in comp: first[c+1] += 1
+  for c in xrange(k): first[c+1] += first[c]
+  pos     = array(_I64, first)
+  for u in xrange(n): c = comp[u]; order[pos[c]] = u; pos[c] += 1
+  offsets = array(_I64, [0]); targets = array("i")
+  seen    = array("i", [-1])*k
+  for c in xrange(k):
+    for u in order[first[c]:first[c+1]]:
+      for v in ts[o[u]:o[u+1]]:
+        c_ = comp[v]
+        if c_ != c and seen[c_] != c: seen[c_] = c; targets.append(c_)
+    offsets.append(len(targets))
+  return CSRGraph(list(xrange(k)), offsets, targets)
+                                                                # }}}1
+
 # === Dijkstra's algorithm ===
 
-def dijkstra(G, s, w, neighbors = None, at_dequeue = None):     # {{{1
-  """Dijkstra's algorithm."""
-  if neighbors is None: neighbors = lambda u: E[u]
-  if isinstance(w, dict): w_, w = w, lambda u, v: w_[u][v]
+def dijkstra(G, s, w, neighbors = None, at_dequeue = None,      # {{{1
+                dary = None, t = None):
+  """Dijkstra's algorithm; uses an indexed dary-ary heap (w/
+  decrease-key) instead of heapq (w/ lazy deletion) if dary is
+  not None; stops as soon as t is settled if t is not None (leaving
+  only upper bounds -- or None -- in d for the unsettled vertices)."""
   V, E  = G; d = { s: 0 }; p = { s: None }; S = set()
-  q     = []; heapq.heappush(q, (0,s))
+  edges = _weighted_edges(G, w, neighbors)
   for u in V: d.setdefault(u, None)
+  if dary is not None:
+    q = IndexedHeap(dary); q.push(s, 0)
+    while q:
+      n, u = q.pop_min()
+      if at_dequeue: at_dequeue(u, q, d)
+      if u == t: break
+      for v, x in edges(u):
+        if d[v] is None or d[v] > n + x:
+          d[v] = n + x; q.push(v, d[v]); p[v] = u
+    return d, p
+  q     = []; heapq.heappush(q, (0,s))
   while q:
     n, u = heapq.heappop(q)
     if u in S: continue
     S.add(u)
     if at_dequeue: at_dequeue(u, q, d)
-    for v in neighbors(u):
-      if d[v] is None or d[v] > d[u] + w(u, v):
-        d[v] = d[u] + w(u, v); heapq.heappush(q, (d[v],v)); p[v] = u
+    if u == t: break
+    for v, x in edges(u):
+      if d[v] is None or d[v] > d[u] + x:
+        d[v] = d[u] + x; heapq.heappush(q, (d[v],v)); p[v] = u
   return d, p
                                                                 # }}}1
 
+def bidirectional_dijkstra(G, s, t, w):                         # {{{1
+  """Bidirectional Dijkstra: searches forward from s and backward
+  from t (on the transposed graph) until the searches meet; returns
+  (distance, path), or None if t is unreachable from s."""
+  edges = _weighted_edges(G, w), _weighted_edges(*_transposed(G, w))
+  d, p  = ({ s: 0 }, { t: 0 }), ({ s: None }, { t: None })
+  S, q  = (set(), set()), ([(0,s)], [(0,t)])
+  mu, m = (0, s) if s == t else (None, None)
+  while q[0] and q[1]:
+    if mu is not None and q[0][0][0] + q[1][0][0] >= mu: break
+    i = 0 if len(q[0]) <= len(q[1]) else 1
+    n, u = heapq.heappop(q[i])
+    if u in S[i]: continue
+    S[i].add(u); di, dj = d[i], d[1-i]
+    for v, x in edges[i](u):
+      if v not in di or di[v] > n + x:
+        di[v] = n + x; p[i][v] = u; heapq.heappush(q[i], (di[v],v))
+      if v in dj and (mu is None or n + x + dj[v] < mu):
+        mu, m = n + x + dj[v], v
+  if mu is None: return None
+  path = shortest_path(p[0], m); v = p[1][m]
+  while v is not None: path.append(v); v = p[1][v]
+  return mu, path
+                                                                # }}}1
+
+def shortest_path(p, t):
+  """Path to t using the predecessors p (as returned by e.g.
+  dijkstra); None if t was not reached."""
+  if t not in p: return None
+  path = []
+  while t is not None: path.append(t); t = p[t]
+  path.reverse(); return path
+
 # === Bellman-Ford algorithm ===
 
-class NegativeWeightCycle(Exception): pass
+class NegativeWeightCycle(Exception):
+  """Negative-weight cycle (the vertices of which are in .cycle)."""
+  def __init__(self, cycle = None):
+    super(NegativeWeightCycle, self).__init__(cycle); self.cycle = cycle
 
-# TODO: add negative-weight cycle test case
-def bellman_ford(G, s, w, after_pass = None):                   # {{{1
-  """Bellman-Ford algorithm."""
-  if isinstance(w, dict): w_, w = w, lambda u, v: w_[u][v]
+def bellman_ford(G, s, w, after_pass = None, early_exit = False): # {{{1
+  """Bellman-Ford algorithm; if early_exit, stops as soon as a pass
+  changes nothing."""
   V, E  = G; d = { s: 0 }; p = { s: None }
-  edges = lambda: ( (u,v) for u in V for v in E[u] )
+  out   = _weighted_edges(G, w)
+  edges = lambda: ( (u,v,x) for u in V for v, x in out(u) )
   for u in V: d.setdefault(u, None)
   for i in xrange(len(V)-1):
-    for u, v in edges():
-      if d[u] is not None and (d[v] is None or d[v] > d[u] + w(u, v)):
-        d[v] = d[u] + w(u, v); p[v] = u
+    changed = False
+    for u, v, x in edges():
+      if d[u] is not None and (d[v] is None or d[v] > d[u] + x):
+        d[v] = d[u] + x; p[v] = u; changed = True
     if after_pass: after_pass(d, p)
-  for u, v in edges():
-    if d[v] is None or d[v] > d[u] + w(u, v):
-      raise NegativeWeightCycle()
+    if early_exit and not changed: return d, p
+  for u, v, x in edges():
+    if d[u] is not None and (d[v] is None or d[v] > d[u] + x):
+      p[v] = u; raise NegativeWeightCycle(_parent_cycle(p, v))
   return d, p
                                                                 # }}}1
 
+def spfa(G, s, w, neighbors = None):                            # {{{1
+  """Queue-based Bellman-Ford ("shortest path faster algorithm"):
+  only relaxes the out-edges of vertices whose distance changed."""
+  V, E  = G; d = { s: 0 }; p = { s: None }; n = len(V)
+  edges = _weighted_edges(G, w, neighbors)
+  q, queued, k = deque([s]), set([s]), { s: 0 }
+  for u in V: d.setdefault(u, None)
+  while q:
+    u = q.popleft(); queued.discard(u)
+    for v, x in edges(u):
+      if d[v] is None or d[v] > d[u] + x:
+        d[v] = d[u] + x; p[v] = u; k[v] = k[u] + 1
+        if k[v] >= n:   # path w/ >= n edges: look for a cycle
+          cycle = _parent_cycle(p, v)
+          if cycle: raise NegativeWeightCycle(cycle)
+        if v not in queued: q.append(v); queued.add(v)
+  return d, p
+                                                                # }}}1
+
+def _parent_cycle(p, v):                                        # {{{1
+  """Cycle in the predecessor graph p reachable from v (which must
+  be a negative-weight one), or None."""
+  seen = set()
+  while v is not None and v not in seen: seen.add(v); v = p[v]
+  if v is None: return None
+  cycle, u = [v], p[v]
+  while u != v: cycle.append(u); u = p[u]
+  cycle.reverse(); return cycle
+                                                                # }}}1
+
+# === Batched shortest paths ===
+
+def shortest_paths_many(G, sources, w = None, negative = False, # {{{1
+                        processes = None, chunksize = 1):
+  """Shortest paths from each of sources, using dijkstra (or
+  bellman_ford if negative); generates (s, d, p) as soon as each
+  result is available (i.e. not necessarily in order).
+
+  The searches are spread over a pool of processes that all attach
+  to a single copy of the graph (as a CSRGraph) in shared memory.
+  Runs in this process if processes == 1, shared memory is not
+  available (python < 3.8), or the weights do not fit in an array."""
+  relabel = not isinstance(G, CSRGraph)
+  if w is None and (relabel or G.weights is None):
+    raise TypeError("no weights (w is None)")
+  if relabel or w is not None: G = csr_graph(G, w)
+  if relabel:
+    index = G.index(); sources = [ index[s] for s in sources ]
+  if processes == 1 or shared_memory is None \
+      or not isinstance(G.weights, array):        # e.g. big ints
+    results = _shared_paths(G, negative, sources)
+  else:
+    results = _shared_paths_pool(G, negative, sources, processes,
+                                 chunksize)
+  for s, d, p in results:
+    if relabel:
+      L = G.labels; s = L[s]
+      d = dict( (L[u],x) for u, x in d.items() )
+      p = dict( (L[u],L[v] if v is not None else None)
+                for u, v in p.items() )
+    yield s, d, p
+                                                                # }}}1
+
+def _shared_paths(G, negative, sources):
+  f = bellman_ford if negative else dijkstra
+  for s in sources:
+    d, p = f(G, s, None); yield s, d, p
+
+def _shared_paths_pool(G, negative, sources, processes,         # {{{1
+                       chunksize):
+  n, m  = len(G), len(G.targets); W = G.weights
+  size  = 8*(n+1) + W.itemsize*m + 4*m
+  shm   = shared_memory.SharedMemory(create = True, size = max(size,1))
+  pool  = None
+  try:
+    buf = shm.buf; a, b = 8*(n+1), 8*(n+1) + W.itemsize*m
+    buf[:a] = memoryview(G.offsets).cast("B")
+    if m:
+      buf[a:b] = memoryview(W).cast("B")
+      buf[b:b+4*m] = memoryview(G.targets).cast("B")
+    del buf
+    pool = multiprocessing.Pool(processes, _shared_paths_init,
+                                (shm.name, n, m, W.typecode, negative))
+    for x in pool.imap_unordered(_shared_paths_worker, sources,
+                                 chunksize):
+      yield x
+  finally:
+    if pool is not None: pool.terminate(); pool.join()
+    shm.close(); shm.unlink()
+                                                                # }}}1
+
+_SHARED_PATHS = {}
+
+def _shared_paths_init(name, n, m, typecode, negative):         # {{{1
+  try:
+    shm = shared_memory.SharedMemory(name, track = False)
+  except TypeError:                                             # < 3.13
+    shm = shared_memory.SharedMemory(name)
+  buf = shm.buf; a = 8*(n+1); b = a + array(typecode).itemsize*m
+  G   = CSRGraph(None, buf[:a].cast(_I64), buf[b:b+4*m].cast("i"),
+                 buf[a:b].cast(typecode))
+  _SHARED_PATHS.update(shm = shm, G = G, negative = negative)
+                                                                # }}}1
+
+def _shared_paths_worker(s):
+  x = _SHARED_PATHS
+  return next(_shared_paths(x["G"], x["negative"], [s]))
+
+# === Shortest-path tree cache ===
+
+class ShortestPathCache(object):                                # {{{1
+  """LRU cache of shortest-path trees (d, p) keyed by (graph version,
+  source) for a graph G with mutable weights w (a dict of dicts).
+
+  Calling the cache w/ a source returns its (d, p), running search
+  (dijkstra or bellman_ford) on a miss.  set_weight() updates the
+  weight of an existing edge and drops just the trees it can affect
+  (or, w/ selective = False, bumps the version).  The cache holds at
+  most maxsize trees and (approximately) maxbytes bytes."""
+  __slots__ = """G w search maxsize maxbytes version cache nbytes
+                 hits misses""".split()
+  def __init__(self, G, w, search = dijkstra, maxsize = 128,
+               maxbytes = None):
+    self.G, self.w, self.search = G, w, search
+    self.maxsize, self.maxbytes = maxsize, maxbytes
+    self.version, self.cache, self.nbytes = 0, OrderedDict(), 0
+    self.hits = self.misses = 0
+  def __len__(self): return len(self.cache)
+  def __call__(self, s):
+    """Shortest-path tree (d, p) from s."""
+    key = (self.version, s); x = self.cache.pop(key, None)
+    if x is not None:
+      self.hits += 1; self.cache[key] = x; return x[:2]
+    self.misses += 1; d, p = self.search(self.G, s, self.w)
+    n = sys.getsizeof(d) + sys.getsizeof(p)
+    self.cache[key] = (d, p, n); self.nbytes += n
+    while len(self.cache) > 1 and (
+        (self.maxsize  is not None and len(self.cache) > self.maxsize) or
+        (self.maxbytes is not None and self.nbytes > self.maxbytes)):
+      self.nbytes -= self.cache.popitem(last = False)[1][2]
+    return d, p
+  def bump(self):
+    """Increment the graph version, invalidating all cached trees."""
+    self.version += 1; self.cache.clear(); self.nbytes = 0
+  def set_weight(self, u, v, x, selective = True):
+    """Set the weight of edge (u,v) to x and invalidate the cached
+    trees this may change."""
+    old = self.w[u][v]; self.w[u][v] = x
+    if x == old: return
+    if not selective: return self.bump()
+    for key, (d, p, n) in list(self.cache.items()):
+      if x > old: stale = p.get(v) == u
+      else:       stale = d[u] is not None and \
+                          (d[v] is None or d[u] + x < d[v])
+      if stale: del self.cache[key]; self.nbytes -= n
+                                                                # }}}1
+
 # === Ford-Fulkerson algorithm ===
 
 # TODO: confirm the algorithm actually works correctly
 def ford_fulkerson(G, s, t, c, after_pass = None):              # {{{1
   """Ford-Fulkerson algorithm."""
-  if isinstance(c, dict): c_, c = c, lambda u, v: c_[u][v]
-  V, E  = G; ET = transpose(G)[1]; f = {}
-  edges = lambda: ( (u,v) for u in V for v in E[u] )
+  V, E  = G; ET = transpose(G)[1]; f = {}; out = _weighted_edges(G, c)
   neighbors, rneighbors = lambda u: E[u], lambda u: ET[u]
   for u in V:   # build residual graph with combined forward & reverse
     f[u] = {}   # edges; thus we need neighbors, rneighbors & cap
-    for v in E[u]: f[u][v] = dict(capacity = c(u,v), flow = 0)
+    for v, x in out(u): f[u][v] = dict(capacity = x, flow = 0)
   cap   = lambda u, v, rev: f[u][v]["capacity"] - f[u][v]["flow"] \
                             if not rev else f[v][u]["flow"]
   path  = find_augmenting_path(s, t, neighbors, rneighbors, cap)
   while path != None:
     b = min( cap(*x) for x in path )
-    for u,v,rev in path: (f[v][u] if rev else f[u][v])["flow"] += b
+    for u,v,rev in path:
+      if rev: f[v][u]["flow"] -= b
+      else:   f[u][v]["flow"] += b
     if after_pass: after_pass(path, b, f)
     path = find_augmenting_path(s, t, neighbors, rneighbors, cap)
   max_flow = sum( f[s][u]["flow"] for u in neighbors(s) )
@@ -827,6 +1977,181 @@ def min_cut(V, f, s, neighbors, rneighbors, cap):               # {{{1
   return cut_a, set(V) - cut_a
                                                                 # }}}1
 
+class FlowNetwork(object):                                      # {{{1
+  """Array-backed residual network for maximum flow (using Dinic's
+  algorithm).
+
+  Vertices are numbered by their position in V.  Edge 2i is the i-th
+  edge (u,v) of the graph and edge 2i+1 its reverse; head[e] is the
+  vertex edge e points to and cap[e] its residual capacity (so the
+  flow on edge 2i is cap[2i+1]).  The edges out of vertex u are
+  adj[offsets[u]:offsets[u+1]]."""
+  __slots__ = "V index head cap offsets adj".split()
+  def __init__(self, G, c):
+    V, E  = G; V = self.V = list(V); n = len(V)
+    out   = _weighted_edges(G, c)
+    index = self.index = dict( (u,i) for i, u in enumerate(V) )
+    head, caps = array("i"), []
+    for u in V:
+      for v, x in out(u):
+        head.append(index[v]); head.append(index[u]); caps += [x, 0]
+    offsets = array(_I64, [0])*(n+1); adj = array("i", head)
+    for v in head: offsets[v+1] += 1  # tail(e) == head(e^1)
+    for u in xrange(n): offsets[u+1] += offsets[u]
+    pos = array(_I64, offsets)
+    for e in xrange(len(head)):
+      u = head[e^1]; adj[pos[u]] = e; pos[u] += 1
+    self.head, self.cap = head, _num_array(caps)
+    self.offsets, self.adj = offsets, adj
+  def max_flow(self, s, t):
+    """Augment the current flow to a maximum flow from s to t;
+    returns the amount of flow added."""
+    s, t = self.index[s], self.index[t]; total = 0
+    if s == t: return total
+    level = self._levels(s)
+    while level[t] >= 0:
+      total += self._blocking_flow(s, t, level); level = self._levels(s)
+    return total
+  def update(self, s, t, changes):
+    """Set the capacities of existing edges (changes maps (u,v) to
+    the new capacity), repair the flow where it now exceeds capacity,
+    and augment it to a maximum flow from s to t again; returns the
+    change in the flow value.  Leaves the network unchanged if it
+    raises an error."""
+    index, head, cap = self.index, self.head, self.cap
+    s, t = index[s], index[t]; before = self.value(self.V[s])
+    es = [ (self._edge(index[u], index[v]), x)
+           for (u, v), x in changes.items() ]
+    if any( x < 0 for _, x in es ):
+      raise ValueError("negative capacity")
+    log = []                                  # (e, cap[e], cap[e^1])
+    for e, x in es:
+      flow = cap[e^1]; log.append((e, cap[e], flow))
+      if flow <= x: cap[e] = x - flow; continue
+      cap[e], cap[e^1], excess = 0, x, flow - x
+      u, v = head[e^1], head[e]
+      excess -= self._push(u, v, excess, log) # reroute around (u,v)
+      if excess and (
+          (u != s and self._push(u, s, excess, log) != excess) or
+          (v != t and self._push(t, v, excess, log) != excess)):
+        for e, a, b in reversed(log): cap[e], cap[e^1] = a, b
+        raise ValueError("could not repair flow (not conserved)")
+    self.max_flow(self.V[s], self.V[t])
+    return self.value(self.V[s]) - before
+  def value(self, s):
+    """Net flow out of s."""
+    u = self.index[s]; o, adj, cap = self.offsets, self.adj, self.cap
+    return sum( cap[e^1] if e & 1 == 0 else -cap[e]
+                for e in adj[o[u]:o[u+1]] )
+  def flows(self):
+    """Flow per edge as f[u][v] = dict(capacity = ..., flow = ...)."""
+    V, head, cap = self.V, self.head, self.cap; f = {}
+    for u in V: f[u] = {}
+    for e in xrange(0, len(head), 2):
+      u, v = V[head[e+1]], V[head[e]]
+      x = f[u].setdefault(v, dict(capacity = 0, flow = 0))
+      x["capacity"] += cap[e] + cap[e+1]; x["flow"] += cap[e+1]
+    return f
+  def cut(self, s):
+    """Cut (S, T) w/ S the vertices reachable from s in the residual
+    network (i.e. a minimum cut if the flow is maximal)."""
+    level = self._levels(self.index[s])
+    cut_a = set( u for u, l in izip(self.V, level) if l >= 0 )
+    return cut_a, set(self.V) - cut_a
+  def _edge(self, u, v):
+    """First edge from u to v."""
+    o, adj, head = self.offsets, self.adj, self.head
+    for e in adj[o[u]:o[u+1]]:
+      if e & 1 == 0 and head[e] == v: return e
+    raise KeyError((self.V[u], self.V[v]))
+  def _push(self, a, b, limit, log = None):
+    """Send up to limit units of flow from a to b along (shortest)
+    residual paths; returns the amount sent (and appends (e, cap[e],
+    cap[e^1]) to log for each edge e it changes)."""
+    o, adj, head, cap = self.offsets, self.adj, self.head, self.cap
+    sent = 0
+    while sent < limit and a != b:
+      pred = { a: None }; q = deque([a])
+      while q and b not in pred:
+        u = q.popleft()
+        for e in adj[o[u]:o[u+1]]:
+          v = head[e]
+          if cap[e] > 0 and v not in pred: pred[v] = e; q.append(v)
+      if b not in pred: break
+      path, v = [], b
+      while v != a: e = pred[v]; path.append(e); v = head[e^1]
+      x = min(limit - sent, min( cap[e] for e in path )); sent += x
+      if log is not None:
+        log.extend( (e, cap[e], cap[e^1]) for e in path )
+      for e in path: cap[e] -= x; cap[e^1] += x
+    return sent
+  def _levels(self, s):
+    """BFS levels in the residual network (-1 if unreachable)."""
+    o, adj, head, cap = self.offsets, self.adj, self.head, self.cap
+    level = array("i", [-1])*len(self.V); level[s] = 0; q = deque([s])
+    while q:
+      u = q.popleft(); l = level[u] + 1
+      for i in xrange(o[u], o[u+1]):
+        e = adj[i]; v = head[e]
+        if cap[e] > 0 and level[v] < 0: level[v] = l; q.append(v)
+    return level
+  def _blocking_flow(self, s, t, level):                        # {{{2
+    """Blocking flow in the level graph (iterative DFS w/ current-arc
+    pointers)."""
+    o, adj, head, cap = self.offsets, self.adj, self.head, self.cap
+    it = array(_I64, o); path = []; u = s; total = 0
+    while True:
+      if u == t:
+        b = min( cap[e] for e in path ); total += b
+        for e in path: cap[e] -= b; cap[e^1] += b
+        k = next( k for k, e in enumerate(path) if cap[e] == 0 )
+        u = head[path[k]^1]; del path[k:]
+        continue
+      i, end, l = it[u], o[u+1], level[u] + 1
+      while i < end and not (cap[adj[i]] > 0 and
+                             level[head[adj[i]]] == l):
+        i += 1
+      it[u] = i
+      if i < end:
+        e = adj[i]; path.append(e); u = head[e]
+      elif u == s: return total
+      else:
+        u = head[path.pop()^1]; it[u] += 1
+                                                                # }}}2
+                                                                # }}}1
+
+def dinic(G, s, t, c):                                          # {{{1
+  """Maximum flow using Dinic's algorithm (on a FlowNetwork); returns
+  (f, max_flow, min_cut) like ford_fulkerson."""
+  N = FlowNetwork(G, c); N.max_flow(s, t)
+  return N.flows(), N.value(s), N.cut(s)
+                                                                # }}}1
+
+def max_flow_update(f, s, t, changes):                         # {{{1
+  """Update maximum flow f (as returned by ford_fulkerson or dinic)
+  after the capacity changes (a dict mapping (u,v) to the new
+  capacity); warm-starts from f instead of from zero flow and returns
+  (f, max_flow, min_cut).
+
+  NB: converting f to and from a FlowNetwork costs O(V+E) per call;
+  for repeated changes, keep a FlowNetwork and use its update()."""
+  V = list(f); E = dict( (u,list(vs)) for u, vs in f.items() )
+  N = FlowNetwork((V,E), lambda u, v: f[u][v]["capacity"])
+  net = dict( (u,0) for u in V )
+  for u in V:
+    for v, x in f[u].items():
+      if not 0 <= x["flow"] <= x["capacity"]:
+        raise ValueError("invalid flow on {}".format((u, v)))
+      net[u] -= x["flow"]; net[v] += x["flow"]
+  if any( net[u] for u in V if u not in (s, t) ):
+    raise ValueError("invalid flow (not conserved)")
+  for e in xrange(0, len(N.head), 2):
+    x = f[V[N.head[e+1]]][V[N.head[e]]]["flow"]
+    N.cap[e] -= x; N.cap[e+1] += x
+  N.update(s, t, changes)
+  return N.flows(), N.value(s), N.cut(s)
+                                                                # }}}1
+
 # === Universal sink (celebrity problem) ===
 
 def universal_sink(G):
@@ -839,10 +2164,111 @@ def universal_sink(G):
     if i != n and (E[n][i] or not E[i][n]): return None
   return n
 
+# === Compact (CSR) graphs ===
+
+class CSRGraph(object):                                         # {{{1
+  """Compact integer-indexed graph (compressed sparse row).
+
+  Vertices are 0..n-1 (labels[u] is the original vertex); the
+  out-edges of u are targets[offsets[u]:offsets[u+1]], with their
+  weights (if any) in the parallel weights array.  A CSRGraph unpacks
+  as (V, E) and can thus be passed as G to any graph function; where
+  a weight or capacity function is expected, None means the stored
+  weights."""
+  class adjacency(object):
+    """Read-only dict-like view of the out-edges of a CSRGraph."""
+    __slots__ = ["g"]
+    def __init__(self, g): self.g = g
+    def __getitem__(self, u): return self.g.neighbors(u)
+    def __len__(self): return len(self.g)
+    def __iter__(self): return iter(xrange(len(self.g)))
+    def keys(self): return xrange(len(self.g))
+    def items(self): return ( (u,self[u]) for u in self )
+  __slots__ = "labels offsets targets weights".split()
+  def __init__(self, labels, offsets, targets, weights = None):
+    self.labels, self.offsets = labels, offsets
+    self.targets, self.weights = targets, weights
+  def __len__(self): return len(self.offsets) - 1
+  def __iter__(self):
+    return iter((xrange(len(self)), type(self).adjacency(self)))
+  def __getitem__(self, i): return tuple(self)[i]
+  def neighbors(self, u):
+    """Out-neighbours of u."""
+    o = self.offsets; return self.targets[o[u]:o[u+1]]
+  def weight(self, u, v):
+    """Weight of edge (u,v)."""
+    o, ts = self.offsets, self.targets
+    for i in xrange(o[u], o[u+1]):
+      if ts[i] == v: return self.weights[i]
+    raise KeyError((u,v))
+  def index(self):
+    """Map from labels to vertices."""
+    return dict( (x,u) for u, x in enumerate(self.labels) )
+  def transpose(self):
+    """Transposed graph (a CSRGraph w/ the same labels)."""
+    n, o, ts, ws = len(self), self.offsets, self.targets, self.weights
+    offsets = array(_I64, [0])*(n+1); targets = array("i", ts)
+    weights = ws[:] if ws is not None else None
+    for v in ts: offsets[v+1] += 1
+    for u in xrange(n): offsets[u+1] += offsets[u]
+    pos = array(_I64, offsets)
+    for u in xrange(n):
+      for i in xrange(o[u], o[u+1]):
+        v = ts[i]; j = pos[v]; pos[v] = j+1; targets[j] = u
+        if ws is not None: weights[j] = ws[i]
+    return CSRGraph(self.labels, offsets, targets, weights)
+                                                                # }}}1
+
+def csr_graph(G, w = None):                                     # {{{1
+  """Convert graph G = (V,E) to a CSRGraph; w (a dict or function)
+  provides the edge weights, if any (stored as int64 if they are all
+  ints, else as floats; in a list if they do not fit)."""
+  if isinstance(w, dict): w_, w = w, lambda u, v: w_[u][v]
+  V, E    = G; labels = list(V)
+  index   = dict( (u,i) for i, u in enumerate(labels) )
+  offsets = array(_I64, [0]); targets = array("i"); weights = []
+  for u in labels:
+    vs = E[u]; targets.extend( index[v] for v in vs )
+    if w is not None: weights.extend( w(u, v) for v in vs )
+    offsets.append(len(targets))
+  weights = _num_array(weights) if w is not None else None
+  return CSRGraph(labels, offsets, targets, weights)
+                                                                # }}}1
+
+def _weighted_edges(G, w, neighbors = None):                    # {{{1
+  """Function returning the out-edges of u as (v, weight) pairs;
+  if w is None, uses the weights stored in CSRGraph G."""
+  if w is None:
+    if not isinstance(G, CSRGraph) or G.weights is None \
+        or neighbors is not None:
+      raise TypeError("no weights (w is None)")
+    o, ts, ws = G.offsets, G.targets, G.weights
+    return lambda u: izip(ts[o[u]:o[u+1]], ws[o[u]:o[u+1]])
+  if isinstance(w, dict): w_, w = w, lambda u, v: w_[u][v]
+  if neighbors is None: E = G[1]; neighbors = lambda u: E[u]
+  return lambda u: ( (v,w(u,v)) for v in neighbors(u) )
+                                                                # }}}1
+
+def _transposed(G, w):
+  """Transposed graph and weights (None for a CSRGraph's own)."""
+  if isinstance(w, dict): w_, w = w, lambda u, v: w_[u][v]
+  return transpose(G), None if w is None else lambda u, v: w(v, u)
+
+def _num_array(xs):
+  """Typed array of the numbers xs (int64 unless there are floats);
+  a list if they do not fit."""
+  xs = list(xs)
+  try:
+    return array("d" if any( isinstance(x, float) for x in xs )
+                 else _I64, xs)
+  except OverflowError:
+    return xs
+
 # === Miscellaneous graph algorithms ===
 
 def transpose(G):
   """Transpose graph."""
+  if isinstance(G, CSRGraph): return G.transpose()
   V, E = G; ET = {}
   for u in V: ET[u] = []
   for u, vs in E.items():
@@ -851,22 +2277,164 @@ def transpose(G):
 
 # === A* Search ===
 
-def a_star(A, B, h, siblings, verbose = False):                 # {{{1
-  """A* search."""
-  frontier = []; seen = set(); heapq.heappush(frontier, (0+h(A),0,A))
+def a_star(A, B, h, siblings, verbose = False, dary = None,     # {{{1
+           with_path = False):
+  """A* search; keeps the best known cost of each node (so only
+  improvements are pushed) and breaks ties in favour of deeper nodes;
+  uses an indexed dary-ary heap (w/ decrease-key) if dary is not
+  None.  Returns (node, cost), or (node, cost, path) w/ with_path."""
+  g, parent = { A: 0 }, { A: None }
+  if dary is None:
+    frontier = []
+    push = lambda n, k: heapq.heappush(frontier, k + (n,))
+    def pop(): x = heapq.heappop(frontier); return x[:2], x[2]
+  else:
+    frontier = IndexedHeap(dary)
+    push, pop = frontier.push, frontier.pop_min
+  push(A, (0+h(A),-0))
   while frontier:
-    f_of_node, cost, node = heapq.heappop(frontier)
-    if node in seen: continue
-    seen.add(node)
-    if node == B: return (node, cost)
+    (f_of_node, cost), node = pop(); cost = -cost
+    if cost > g[node]: continue   # stale
+    if node == B:
+      return (node, cost, shortest_path(parent, node)) if with_path \
+        else (node, cost)
     if verbose: print(node, f_of_node)
     for sibling, cost_from_node in siblings(node):
-      s_cost = cost + cost_from_node; f_of_s = s_cost + h(sibling)
+      s_cost = cost + cost_from_node
+      if sibling in g and s_cost >= g[sibling]: continue
+      g[sibling], parent[sibling] = s_cost, node
+      f_of_s = s_cost + h(sibling)
       if verbose: print("  ->", sibling, f_of_s)
-      heapq.heappush(frontier, (f_of_s,s_cost,sibling))
+      push(sibling, (f_of_s,-s_cost))
   return None
                                                                 # }}}1
 
+def ida_star(A, B, h, siblings):                                # {{{1
+  """IDA* (iterative deepening A*): depth-first search w/ increasing
+  bounds on f = cost + h, using memory linear in the path length;
+  returns (node, cost, path) or None."""
+  if A == B: return (A, 0, [A])
+  bound = h(A)
+  while True:
+    path, costs, on_path = [A], [0], set([A])
+    stack, next_bound = [iter(siblings(A))], None
+    while stack:
+      for sibling, cost_from_node in stack[-1]:
+        if sibling in on_path: continue
+        s_cost = costs[-1] + cost_from_node
+        f_of_s = s_cost + h(sibling)
+        if f_of_s > bound:
+          if next_bound is None or f_of_s < next_bound:
+            next_bound = f_of_s
+          continue
+        if sibling == B: return (B, s_cost, path + [B])
+        path.append(sibling); costs.append(s_cost); on_path.add(sibling)
+        stack.append(iter(siblings(sibling))); break
+      else:
+        stack.pop(); on_path.discard(path.pop()); costs.pop()
+    if next_bound is None: return None
+    bound = next_bound
+                                                                # }}}1
+
+def beam_search(A, B, h, siblings, width, max_depth = None):    # {{{1
+  """Beam search: breadth-first, but only keeping the width best
+  nodes (by f = cost + h) of each layer; not optimal (nor complete).
+  Nodes kept earlier at no higher cost are dropped (so it terminates
+  on finite graphs w/ non-negative costs); the table of their best
+  costs grows by up to width nodes per layer, so this uses
+  O(width * depth) memory (bounded by max_depth, if not None, and by
+  the number of distinct nodes).  Returns (node, cost, path) or
+  None."""
+  layer, depth, best = { A: (0, (A, None)) }, 0, { A: 0 }
+  f = lambda x: x[1][0] + h(x[0])
+  while layer:
+    if B in layer:
+      cost, link = layer[B]; path = []
+      while link: node, link = link; path.append(node)
+      path.reverse(); return (B, cost, path)
+    if max_depth is not None and depth >= max_depth: break
+    next_layer = {}
+    for node, (cost, link) in layer.items():
+      for sibling, cost_from_node in siblings(node):
+        s_cost = cost + cost_from_node
+        if sibling in best and best[sibling] <= s_cost: continue
+        x = next_layer.get(sibling)
+        if x is None or s_cost < x[0]:
+          next_layer[sibling] = (s_cost, (sibling, link))
+    layer  = dict(heapq.nsmallest(width, next_layer.items(), key = f))
+    for node, (cost, _) in layer.items(): best[node] = cost
+    depth += 1
+  return None
+                                                                # }}}1
+
+class Landmarks(object):                                        # {{{1
+  """Landmark (ALT) lower bounds for A*: the distances from and to k
+  landmarks, in typed arrays (landmark-major; inf if unreachable);
+  heuristic(t) uses the triangle inequality to bound the distance
+  from any vertex to t."""
+  MAGIC     = b"ALTLMK01"
+  __slots__ = "V index landmarks dfrom dto".split()
+  def __init__(self, V, landmarks, dfrom, dto):
+    self.V, self.landmarks = V, landmarks
+    self.dfrom, self.dto   = dfrom, dto
+    self.index = dict( (u,i) for i, u in enumerate(V) )
+  def heuristic(self, t):
+    """Lower bound on the distance to t (as function of the vertex)."""
+    n, k, index = len(self.V), len(self.landmarks), self.index
+    F, T, j     = self.dfrom, self.dto, index[t]
+    Ft, Tt      = [ F[i*n+j] for i in xrange(k) ], \
+                  [ T[i*n+j] for i in xrange(k) ]
+    def h(v):
+      u = index[v]; x = 0
+      for i in xrange(k):   # NB: nan (inf - inf) never compares larger
+        a = Ft[i] - F[i*n+u]; b = T[i*n+u] - Tt[i]
+        if a > x: x = a
+        if b > x: x = b
+      return x
+    return h
+  def save(self, path):
+    """Save to file (w/ little-endian arrays)."""
+    with open(path, "wb") as f:
+      f.write(struct.pack("<8sQQ", self.MAGIC, len(self.V),
+                          len(self.landmarks)))
+      for a in (array(_I64, self.landmarks), self.dfrom, self.dto):
+        if sys.byteorder == "big":
+          a = array(a.typecode, a); a.byteswap()
+        a.tofile(f)
+                                                                # }}}1
+
+def landmarks(G, w, k = 8, first = None):                       # {{{1
+  """Choose k landmarks for graph G w/ weights w (farthest-point
+  selection, starting w/ the vertex farthest from first) and compute
+  their Landmarks."""
+  V = list(G[0]); n = len(V); GT, wt = _transposed(G, w)
+  inf = float("inf"); dfrom, dto, L = array("d"), array("d"), []
+  def dist(G, s, w):
+    d = dijkstra(G, s, w)[0]
+    return array("d", ( inf if d[u] is None else d[u] for u in V ))
+  near = dist(G, V[0] if first is None else first, w)
+  for i in xrange(min(k, n)):
+    j = max(xrange(n), key = lambda j: (near[j], -j)); L.append(j)
+    d = dist(G, V[j], w); dfrom.extend(d)
+    dto.extend(dist(GT, V[j], wt))
+    for j in xrange(n): near[j] = min(near[j], d[j])
+    near[L[-1]] = -1
+  return Landmarks(V, L, dfrom, dto)
+                                                                # }}}1
+
+def load_landmarks(path, G):
+  """Load Landmarks for G saved w/ Landmarks.save()."""
+  V = list(G[0])
+  with open(path, "rb") as f:
+    magic, n, k = struct.unpack("<8sQQ", f.read(24))
+    if magic != Landmarks.MAGIC or n != len(V):
+      raise ValueError("not landmarks for this graph")
+    L, dfrom, dto = array(_I64), array("d"), array("d")
+    L.fromfile(f, k); dfrom.fromfile(f, k*n); dto.fromfile(f, k*n)
+  if sys.byteorder == "big":
+    for a in (L, dfrom, dto): a.byteswap()
+  return Landmarks(V, list(L), dfrom, dto)
+
 # === MiniMax w/ Alpha-Beta Pruning ===
 
 def minimax_alphabeta(node, alpha, beta, leaf_node  = None,     # {{{1
@@ -876,23 +2444,34 @@ def minimax_alphabeta(node, alpha, beta, leaf_node  = None,     # {{{1
   """MiniMax w/ Alpha-Beta Pruning."""
   leaf_node, value, children, set_value = minimax_defaults( \
   leaf_node, value, children, set_value)
-  if verbose: print(pre + "minimax({}, {})".format(alpha, beta))
+  return _minimax_alphabeta(node, alpha, beta, leaf_node, value,
+                            children, set_value, start_max,
+                            pre if verbose else None)
+                                                                # }}}1
+
+def _minimax_alphabeta(node, alpha, beta, leaf_node, value,     # {{{1
+                       children, set_value, start_max, pre):
+  """MiniMax w/ Alpha-Beta Pruning (w/ defaults filled in; verbose
+  iff pre is not None)."""
+  if pre is not None: print(pre + "minimax({}, {})".format(alpha, beta))
   if leaf_node(node):
-    if verbose: print(pre + "| leaf (value = {})".format(value(node)))
+    if pre is not None:
+      print(pre + "| leaf (value = {})".format(value(node)))
     return value(node)
   for child_node in children(node):
-    x = minimax_alphabeta(child_node, alpha, beta, leaf_node, value,
-                          children, set_value, not start_max, verbose,
-                          pre + "  ")
+    x = _minimax_alphabeta(child_node, alpha, beta, leaf_node, value,
+                           children, set_value, not start_max,
+                           pre + "  " if pre is not None else None)
     if start_max: alpha = max(alpha, x)
     else:         beta  = min(beta , x)
-    if verbose: print(pre + "| alpha = {} beta = {}".format(alpha, beta))
+    if pre is not None:
+      print(pre + "| alpha = {} beta = {}".format(alpha, beta))
     if alpha >= beta:
       v = beta if start_max else alpha
-      if verbose: print(pre + "| pruning; value = {}".format(v))
+      if pre is not None: print(pre + "| pruning; value = {}".format(v))
       set_value(node, v); return v
   v = alpha if start_max else beta
-  if verbose: print(pre + "| value = {}".format(v))
+  if pre is not None: print(pre + "| value = {}".format(v))
   set_value(node, v); return v
                                                                 # }}}1
 
@@ -905,59 +2484,532 @@ def minimax_defaults(l, v, c, s):                               # {{{1
   return l, v, c, s
                                                                 # }}}1
 
+class TranspositionTable(object):                               # {{{1
+  """Bounded transposition table: size slots (indexed by the hash of
+  the key), each holding one (key, depth, flag, value, best) entry,
+  where flag is EXACT, LOWER or UPPER (bound) and best the key of the
+  best child.  When two keys collide, replace = "depth" keeps the
+  deeper entry, "always" the newer one."""
+  EXACT, LOWER, UPPER = 0, 1, 2
+  __slots__ = "size replace slots".split()
+  def __init__(self, size = 1 << 16, replace = "depth"):
+    if replace not in ("depth", "always"):
+      raise ValueError("replace must be 'depth' or 'always'")
+    self.size, self.replace, self.slots = size, replace, [None]*size
+  def __len__(self):
+    return sum( 1 for e in self.slots if e is not None )
+  def get(self, key):
+    """Entry for key (or None)."""
+    e = self.slots[hash(key) % self.size]
+    return e if e is not None and e[0] == key else None
+  def put(self, key, depth, flag, value, best = None):
+    """Store entry (subject to the replacement policy)."""
+    i = hash(key) % self.size; e = self.slots[i]
+    if e is None or e[0] == key or self.replace == "always" or \
+       depth >= e[1]:
+      self.slots[i] = (key, depth, flag, value, best)
+                                                                # }}}1
+
+def minimax_search(node, alpha, beta, key, leaf_node = None,    # {{{1
+                   value    = None, children = None,
+                   start_max = True, depth = None, evaluate = None,
+                   tt = None, ordering = True, stats = None):
+  """MiniMax w/ Alpha-Beta Pruning, a transposition table (tt; w/
+  positions identified by key(node), which must thus also identify
+  the player to move), iterative deepening (up to depth, if not None;
+  evaluate(node) scores non-leaf nodes at the horizon, so depth = 0
+  just evaluates node) and move ordering (best move from tt, then
+  killer moves, then history).  Returns the same value as
+  minimax_alphabeta (for depth = None); stats["nodes"] counts the
+  nodes visited."""
+  leaf_node, value, children, _ = minimax_defaults( \
+  leaf_node, value, children, None)
+  if evaluate is None: evaluate = value
+  if tt is None: tt = TranspositionTable()
+  if stats is None: stats = {}
+  stats.setdefault("nodes", 0)
+  TT = TranspositionTable; EXACT, LOWER, UPPER = TT.EXACT, TT.LOWER, \
+                                                 TT.UPPER
+  killers, history = {}, {}
+  def search(node, alpha, beta, depth, maximise, ply):
+    stats["nodes"] += 1
+    if leaf_node(node): return value(node)
+    if depth == 0: return evaluate(node)
+    k = key(node); e = tt.get(k); best = None
+    if e is not None:
+      best = e[4]
+      if e[1] >= depth:
+        v = e[3]
+        if e[2] == EXACT: return max(alpha, min(beta, v))
+        if e[2] == LOWER:
+          if v >= beta: return beta
+          alpha = max(alpha, v)
+        else:
+          if v <= alpha: return alpha
+          beta = min(beta, v)
+    a0, b0 = alpha, beta; cs = list(children(node))
+    ks = [ key(c) for c in cs ]; order = xrange(len(cs))
+    if ordering and len(cs) > 1:
+      kill = killers.get(ply, ())
+      order = sorted(order, key = lambda i: (ks[i] != best,
+        ks[i] not in kill, -history.get(ks[i], 0)))
+    best = None
+    for i in order:
+      x = search(cs[i], alpha, beta, depth - 1, not maximise, ply + 1)
+      if maximise and x > alpha: alpha, best = x, ks[i]
+      elif not maximise and x < beta: beta, best = x, ks[i]
+      if alpha >= beta:
+        if ordering:
+          kill = killers.setdefault(ply, [])
+          if ks[i] not in kill: kill.insert(0, ks[i]); del kill[2:]
+          history[ks[i]] = history.get(ks[i], 0) + (1 << min(depth, 32))
+        v = beta if maximise else alpha; break
+    else: v = alpha if maximise else beta
+    flag = UPPER if v <= a0 else LOWER if v >= b0 else EXACT
+    tt.put(k, depth, flag, v, best); return v
+  if depth is None:
+    return search(node, alpha, beta, float("inf"), start_max, 0)
+  if depth < 0: raise ValueError("negative depth")
+  for d in xrange(min(1, depth), depth + 1):
+    v = search(node, alpha, beta, d, start_max, 0)
+  return v
+                                                                # }}}1
+
+def minimax_parallel(node, alpha, beta, leaf_node = None,       # {{{1
+                     value = None, children = None, start_max = True,
+                     processes = None, chunksize = 1):
+  """MiniMax w/ Alpha-Beta Pruning, w/ the children of node searched
+  in parallel by a pool of processes (root splitting).
+
+  The eldest child is searched first, here (as in Young Brothers
+  Wait); its siblings are then spread over the pool.  The root bound
+  (alpha if start_max, else beta) is shared by all workers, which
+  re-read it before each grandchild, so a value found by one worker
+  prunes the others.  Returns the same value as minimax_alphabeta
+  (but does not set node values).  The workers inherit node,
+  leaf_node etc. by fork (they are not pickled), so this runs in this
+  process if processes == 1 or fork is not available."""
+  leaf_node, value, children, _ = minimax_defaults( \
+  leaf_node, value, children, None)
+  nop = lambda x, v: None; ctx = _fork_context()
+  if processes == 1 or ctx is None or leaf_node(node):
+    return _minimax_alphabeta(node, alpha, beta, leaf_node, value,
+                              children, nop, start_max, None)
+  def update(x):
+    return (max(alpha, x), beta) if start_max else (alpha, min(beta, x))
+  cs = list(children(node))
+  if cs:
+    alpha, beta = update(_minimax_alphabeta(cs[0], alpha, beta,
+      leaf_node, value, children, nop, not start_max, None))
+  if alpha < beta and len(cs) > 1:
+    bound = ctx.Value("d", alpha if start_max else beta)
+    pool  = ctx.Pool(processes, _parallel_minimax_init,
+                     (cs, alpha, beta, leaf_node, value, children,
+                      start_max, bound))
+    try:
+      for x in pool.imap_unordered(_parallel_minimax_worker,
+                                   xrange(1, len(cs)), chunksize):
+        alpha, beta = update(x)
+        if alpha >= beta: break
+    finally:
+      pool.terminate(); pool.join()
+  return min(alpha, beta) if start_max else max(alpha, beta)
+                                                                # }}}1
+
+def _fork_context():
+  """multiprocessing context that forks (or None if unavailable)."""
+  if not hasattr(multiprocessing, "get_context"):       # python 2
+    return None if sys.platform == "win32" else multiprocessing
+  try:
+    return multiprocessing.get_context("fork")
+  except ValueError:
+    return None
+
+_PARALLEL_MINIMAX = {}
+
+def _parallel_minimax_init(cs, alpha, beta, leaf_node, value,   # {{{1
+                           children, start_max, bound):
+  _PARALLEL_MINIMAX.update(cs = cs, alpha = alpha, beta = beta,
+    leaf_node = leaf_node, value = value, children = children,
+    start_max = start_max, bound = bound)
+                                                                # }}}1
+
+def _parallel_minimax_worker(i):                                # {{{1
+  x = _PARALLEL_MINIMAX; node, bound = x["cs"][i], x["bound"]
+  l, v, c, mx = x["leaf_node"], x["value"], x["children"], \
+                x["start_max"]
+  a, b = x["alpha"], x["beta"]; nop = lambda x, v: None
+  if l(node): r = v(node)
+  else:
+    for child in c(node):                           # node: not mx
+      if mx: a = max(a, bound.value)
+      else:  b = min(b, bound.value)
+      if a >= b: break
+      y = _minimax_alphabeta(child, a, b, l, v, c, nop, mx, None)
+      if mx: b = min(b, y)
+      else:  a = max(a, y)
+      if a >= b: break
+    r = (a if a >= b else b) if mx else (b if a >= b else a)
+  with bound.get_lock():
+    if (r > bound.value) if mx else (r < bound.value): bound.value = r
+  return r
+                                                                # }}}1
+
 # === d-ary heap ===
 
 def heap_parent(d, i):
   """Parent in d-ary heap of element at position i in list."""
   return (i-1)//d
 
-def maxheapify(d, A, i, size = None):                           # {{{1
+class DaryHeap(object):                                         # {{{1
+  """d-ary min-heap (or max-heap, if maxheap) of items, ordered by
+  key(item) if key is not None (w/ the keys computed once and cached
+  alongside the items).
+
+  Stores the items in an array of typecode (if not None); otherwise,
+  a list or other mutable sequence of items (e.g. an array, or a
+  memoryview of any writable buffer) is used (and heapified) in
+  place -- though only lists and arrays can grow or shrink; other
+  iterables are copied into a list."""
+  __slots__ = "d maxheap key lt items keys".split()
+  def __init__(self, items = (), d = 2, maxheap = False, key = None,
+               typecode = None, heapify = True):
+    if typecode is not None: items = array(typecode, items)
+    elif not hasattr(items, "__setitem__"): items = list(items)
+    self.d, self.maxheap, self.key, self.items = d, maxheap, key, items
+    self.lt   = operator.gt if maxheap else operator.lt
+    self.keys = items if key is None else [ key(x) for x in items ]
+    if heapify:
+      for i in xrange((len(items)-2)//d, -1, -1): self._sift_down(i)
+  def __len__(self): return len(self.items)
+  def __repr__(self): return "DaryHeap({})".format(list(self.items))
+  def peek(self):
+    """Top (i.e. minimum or maximum) item."""
+    if not self.items: raise IndexError("heap underflow")
+    return self.items[0]
+  def push(self, x):
+    """Insert item."""
+    self.items.append(x)
+    if self.key is not None: self.keys.append(self.key(x))
+    self._sift_up(len(self.items) - 1)
+  def pop(self):
+    """Pop top item."""
+    if not self.items: raise IndexError("heap underflow")
+    return self.remove(0)
+  def pushpop(self, x):
+    """Push item, then pop top item (faster)."""
+    k = x if self.key is None else self.key(x)
+    if not self.items or not self.lt(self.keys[0], k): return x
+    return self._replace(x, k)
+  def replace(self, x):
+    """Pop top item, then push item (faster)."""
+    if not self.items: raise IndexError("heap underflow")
+    return self._replace(x, x if self.key is None else self.key(x))
+  def _replace(self, x, k):
+    A, K = self.items, self.keys; top = A[0]; A[0] = x
+    if K is not A: K[0] = k
+    self._sift_down(0); return top
+  def decrease_key(self, i, x):
+    """Replace item at position i w/ x, which must not be ordered
+    after it (i.e. decrease its key for a min-heap, increase it for
+    a max-heap)."""
+    A, K = self.items, self.keys
+    k = x if self.key is None else self.key(x)
+    if self.lt(K[i], k):
+      raise ValueError("new key {} than current key".format(
+                       "less" if self.maxheap else "greater"))
+    A[i] = x
+    if K is not A: K[i] = k
+    self._sift_up(i)
+  def remove(self, i):
+    """Remove (and return) item at position i."""
+    A, K = self.items, self.keys; x = A[i]
+    last = A.pop(); k = last if K is A else K.pop()
+    if i < len(A):
+      A[i] = last
+      if K is not A: K[i] = k
+      if i > 0 and self.lt(k, K[(i-1)//self.d]): self._sift_up(i)
+      else: self._sift_down(i)
+    return x
+  def sort(self):                                               # {{{2
+    """Sort the items in place (ascending for a max-heap, descending
+    for a min-heap) and return them; empties the heap."""
+    A, K = self.items, self.keys
+    for i in xrange(len(A)-1, 0, -1):
+      A[0], A[i] = A[i], A[0]
+      if K is not A: K[0], K[i] = K[i], K[0]
+      self._sift_down(0, i)
+    self.items = A[:0]; self.keys = self.items if K is A else []
+    return A
+                                                                # }}}2
+  def _sift_up(self, i):                                        # {{{2
+    A, K, d, lt = self.items, self.keys, self.d, self.lt
+    x, k = A[i], K[i]
+    while i > 0:
+      p = (i-1)//d
+      if not lt(k, K[p]): break
+      A[i] = A[p]
+      if K is not A: K[i] = K[p]
+      i = p
+    A[i] = x
+    if K is not A: K[i] = k
+                                                                # }}}2
+  def _sift_down(self, i, size = None):                         # {{{2
+    A, K, d, lt = self.items, self.keys, self.d, self.lt
+    if size is None: size = len(A)
+    x, k = A[i], K[i]
+    while True:
+      c = d*i + 1
+      if c >= size: break
+      j, kj = c, K[c]
+      for c in xrange(c + 1, min(c + d, size)):
+        if lt(K[c], kj): j, kj = c, K[c]
+      if not lt(kj, k): break
+      A[i] = A[j]
+      if K is not A: K[i] = kj
+      i = j
+    A[i] = x
+    if K is not A: K[i] = k
+                                                                # }}}2
+                                                                # }}}1
+
+def _maxheap(d, A, heapify = False):
+  """DaryHeap (max-heap) on A itself; raises TypeError if A cannot be
+  changed in place (DaryHeap would copy it)."""
+  if not hasattr(A, "__setitem__"):
+    raise TypeError("'{}' object does not support item assignment"
+                    .format(type(A).__name__))
+  return DaryHeap(A, d, True, heapify = heapify)
+
+def maxheapify(d, A, i, size = None):
   """Float element at position i in list down its subtrees in the
   d-ary heap (to preserve the max-heap property)."""
-  if size is None: size = len(A)
-  largest = i
-  for j in xrange(d*i+1, min(size, d*i+d+1)):
-    if A[j] > A[largest]: largest = j
-  if largest != i:
-    A[i], A[largest] = A[largest], A[i]
-    maxheapify(d, A, largest, size)
-                                                                # }}}1
+  _maxheap(d, A)._sift_down(i, size)
 
-# TODO: smaller range?
 def build_maxheap(d, A):
-  """Turn list A into a d-ary max-heap."""
-  for i in xrange(len(A)-1, -1, -1): maxheapify(d, A, i)
+  """Turn list A into a d-ary max-heap; d = "auto" picks the
+  (measured) best arity (see heap_benchmark)."""
+  _maxheap(_heap_arity(d, "build", A), A, True)
 
 def heapsort(d, A, copy = False):
-  """Heapsort."""
-  if copy: A = A[:]
-  size = len(A); build_maxheap(d, A)
-  for i in xrange(len(A)-1, 0, -1):
-    A[0], A[i] = A[i], A[0]; size -= 1
-    maxheapify(d, A, 0, size)
+  """Heapsort; d = "auto" picks the (measured) best arity (see
+  heap_benchmark).  Sorts A -- a list or any other mutable sequence,
+  e.g. an array or a memoryview of an mmap -- in place; or returns
+  a sorted copy (an array, for a memoryview; a bytearray, for an
+  mmap)."""
+  if copy: A = _sequence_copy(A)
+  _maxheap(_heap_arity(d, "sort", A), A, True).sort()
   if copy: return A
 
+def heapsort_indices(d, A, key = None):
+  """Heapsort A indirectly: returns (w/o moving any of its elements)
+  an array p of the indices of A, such that A[p[0]], A[p[1]], ...
+  are sorted (by key(A[i]) if key is not None)."""
+  k = A.__getitem__ if key is None else lambda i: key(A[i])
+  h = DaryHeap(xrange(len(A)), _heap_arity(d, "sort", A), True,
+               key = k, typecode = _I64)
+  return h.sort()
+
+def nlargest(k, iterable, key = None, d = 2):
+  """The k largest items of iterable (by key, if not None), largest
+  first (and ties in order of appearance, as with sorted); consumes
+  the iterable once, keeping (a d-ary heap of) just k items."""
+  return _nbest(k, iterable, key, d, True)
+
+def nsmallest(k, iterable, key = None, d = 2):
+  """The k smallest items of iterable (by key, if not None); see
+  nlargest."""
+  return _nbest(k, iterable, key, d, False)
+
+def _nbest(k, iterable, key, d, largest):                       # {{{1
+  if k <= 0: return []
+  h, it, s = DaryHeap([], d, not largest), iter(iterable), \
+             -1 if largest else 1
+  for i, x in izip(xrange(k), it):
+    h.push((x if key is None else key(x), s*i, x))
+  top, lt = h.items, h.lt
+  for i, x in izip(itertools.count(k), it):
+    kx = x if key is None else key(x)
+    if lt(top[0][0], kx): h.replace((kx, s*i, x))
+  return [ e[2] for e in h.sort() ]
+                                                                # }}}1
+
+def partial_sort(d, A, k, key = None, reverse = False):         # {{{1
+  """Rearrange mutable sequence A (in place) so that A[:k] are its
+  k smallest (or largest, if reverse) elements (by key, if not
+  None), in order; the order of the rest is unspecified (and ties
+  may be reordered).  Keeps (a d-ary heap of) just k elements."""
+  k = min(k, len(A))
+  if k <= 0: return
+  h = DaryHeap(A[:k], d, not reverse, key = key)
+  top, lt = h.keys, h.lt
+  for j in xrange(k, len(A)):
+    x = A[j]
+    if lt(top[0], x if key is None else key(x)): A[j] = h.replace(x)
+  A[:k] = h.sort()
+                                                                # }}}1
+
+def _sequence_copy(A):
+  """Copy of A (an array, for a memoryview; a bytearray, for an
+  mmap)."""
+  if isinstance(A, memoryview): return array(A.format, A.tobytes())
+  if isinstance(A, mmap.mmap): return bytearray(A[:])
+  return A[:]
+
 def heap_extract_max(d, A):
   """Pop maximum element from d-ary heap."""
-  if len(A) < 1: raise IndexError("heap underflow")
-  m, A[0] = A[0], A[len(A)-1]
-  A.pop(); maxheapify(d, A, 0)
-  return m
+  return _maxheap(d, A).pop()
 
 def heap_insert(d, A, key):
   """Insert element into d-ary heap."""
-  A.append(None); i = len(A)-1
-  while i > 0 and A[heap_parent(d, i)] < key:
-    p = heap_parent(d, i); A[i], i = A[p], p
-  A[i] = key
+  _maxheap(d, A).push(key)
 
 def heap_increase_key(d, A, i, key):
   """Increase key of element at position i in list whilst preserving
   the max-heap property of the d-ary heap."""
-  if key < A[i]: raise ValueError("new key less than current key")
-  A[i] = key
-  while i > 0 and A[heap_parent(d, i)] < A[i]:
-    p = heap_parent(d, i); A[i], A[p], i = A[p], A[i], p
+  _maxheap(d, A).decrease_key(i, key)
+
+class IndexedHeap(object):                                      # {{{1
+  """Indexed d-ary min-heap of items w/ keys (and decrease-key);
+  items must be hashable and are unique."""
+  __slots__ = "d keys items pos".split()
+  def __init__(self, d = 2):
+    self.d, self.keys, self.items, self.pos = d, [], [], {}
+  def __len__(self): return len(self.items)
+  def __contains__(self, item): return item in self.pos
+  def __getitem__(self, item):
+    """Key of item."""
+    return self.keys[self.pos[item]]
+  def __repr__(self):
+    return "IndexedHeap({})".format(list(zip(self.keys, self.items)))
+  def push(self, item, key):
+    """Insert item; or decrease its key if already present."""
+    if item in self.pos: return self.decrease_key(item, key)
+    self.keys.append(key); self.items.append(item)
+    self.pos[item] = len(self.items) - 1
+    self._sift_up(len(self.items) - 1)
+  def decrease_key(self, item, key):
+    """Decrease key of item whilst preserving the min-heap property."""
+    i = self.pos[item]
+    if key > self.keys[i]:
+      raise ValueError("new key greater than current key")
+    self.keys[i] = key; self._sift_up(i)
+  def peek_min(self):
+    """Minimum (key, item)."""
+    if not self.items: raise IndexError("heap underflow")
+    return self.keys[0], self.items[0]
+  def pop_min(self):
+    """Pop minimum (key, item)."""
+    m = self.peek_min(); del self.pos[m[1]]
+    key, item = self.keys.pop(), self.items.pop()
+    if self.items:
+      self.keys[0], self.items[0], self.pos[item] = key, item, 0
+      self._sift_down(0)
+    return m
+  def _sift_up(self, i):
+    d, K, X, P = self.d, self.keys, self.items, self.pos
+    key, item = K[i], X[i]
+    while i > 0:
+      p = heap_parent(d, i)
+      if not key < K[p]: break
+      K[i], X[i] = K[p], X[p]; P[X[i]] = i; i = p
+    K[i], X[i], P[item] = key, item, i
+  def _sift_down(self, i):
+    d, K, X, P = self.d, self.keys, self.items, self.pos
+    key, item = K[i], X[i]; size = len(K)
+    while True:
+      j = d*i+1
+      if j >= size: break
+      for k in xrange(j+1, min(size, j+d)):
+        if K[k] < K[j]: j = k
+      if not K[j] < key: break
+      K[i], X[i] = K[j], X[j]; P[X[i]] = i; i = j
+    K[i], X[i], P[item] = key, item, i
+                                                                # }}}1
+
+# === d-ary heap benchmarks ===
+
+HEAP_ARITIES    = (2, 3, 4, 5, 6, 8, 12, 16)
+HEAP_WORKLOADS  = ("build", "sort", "insert-extract")
+HEAP_KEYS       = OrderedDict([
+  ("int"  , lambda r, n: [ r.randrange(1 << 30) for _ in xrange(n) ]),
+  ("float", lambda r, n: [ r.random() for _ in xrange(n) ]),
+  ("str"  , lambda r, n: [ "%016x" % r.getrandbits(64)
+                           for _ in xrange(n) ]),
+  ("tuple", lambda r, n: [ (r.randrange(n), r.random())
+                           for _ in xrange(n) ])])
+
+_HEAP_BEST_D      = {}    # (workload, key type, size bucket) -> d
+_HEAP_AUTO_SAMPLE = 4096
+
+def heap_benchmark(ds = HEAP_ARITIES, sizes = (1000, 100000),   # {{{1
+                   keys = tuple(HEAP_KEYS), workloads = HEAP_WORKLOADS,
+                   repeat = 3, data = HEAP_KEYS, seed = 0,
+                   report = None):
+  """Time the heap workloads (build: build_maxheap; sort: heapsort;
+  insert-extract: n pushes, then n pops) for each arity in ds, size
+  in sizes and key type in keys (w/ data[key](rng, n) generating the
+  input); best of repeat runs.
+
+  Returns {(workload, key, size): {d: seconds}}, prints a table to
+  report (a file; stdout if None; nowhere if False) and records the
+  best d per (workload, key type, size bucket) for d = "auto"."""
+  rng, results = random.Random(seed), {}
+  if report is not False:
+    print("{:14} {:6} {:>8}".format("workload", "key", "size") +
+          "".join( "{:>9}".format("d={}".format(d)) for d in ds ) +
+          "  best", file = report)
+  for workload in workloads:
+    for key in keys:
+      for n in sizes:
+        xs = data[key](rng, n)
+        ts = dict( (d,min( _heap_workload(workload, d, xs)
+                           for _ in xrange(repeat) )) for d in ds )
+        results[(workload, key, n)] = ts; best = min(ds, key = ts.get)
+        if xs:
+          kind = type(xs[0]).__name__
+          _HEAP_BEST_D[(workload, kind, _size_bucket(n))] = best
+        if report is not False:
+          print("{:14} {:6} {:8}".format(workload, key, n) +
+                "".join( "{:9.3f}".format(1000*ts[d]) for d in ds ) +
+                "{:6}".format(best), file = report)
+  return results
+                                                                # }}}1
+
+def _heap_workload(workload, d, xs):                            # {{{1
+  A = list(xs); t = timeit.default_timer()
+  if workload == "build": build_maxheap(d, A)
+  elif workload == "sort": heapsort(d, A)
+  elif workload == "insert-extract":
+    h = DaryHeap([], d, True)
+    for x in A: h.push(x)
+    while h: h.pop()
+  else: raise ValueError("unknown workload: {}".format(workload))
+  return timeit.default_timer() - t
+                                                                # }}}1
+
+def _heap_arity(d, workload, A):                                # {{{1
+  """d, or (if d == "auto") the measured best arity for the workload
+  on A: from the table filled by heap_benchmark, or by benchmarking
+  a sample of A."""
+  if d != "auto": return d
+  n = len(A)
+  if n < 2: return 2
+  b = (workload, type(A[0]).__name__, _size_bucket(n))
+  if b not in _HEAP_BEST_D:
+    r, m  = random.Random(n), min(n, _HEAP_AUTO_SAMPLE)
+    xs    = [ A[r.randrange(n)] for _ in xrange(m) ]
+    ts    = heap_benchmark(sizes = (m,), keys = ("sample",),
+                           workloads = (workload,),
+                           data = dict(sample = lambda r, n: xs),
+                           report = False)[(workload, "sample", m)]
+    _HEAP_BEST_D[b] = min(HEAP_ARITIES, key = ts.get)
+  return _HEAP_BEST_D[b]
+                                                                # }}}1
+
+def _size_bucket(n):
+  """Size bucket (number of decimal digits) of n."""
+  return len(str(n))
 
 # === Extended Euclidean algorithm ===
 
@@ -1036,43 +3088,299 @@ def erastothenes():                                             # {{{1
       composites[m] = p
                                                                 # }}}1
 
-def _make_prime_sieve(sieve = None):                            # {{{1
-  """Generate lazy memoising prime sieve."""
-  PRIMES, lock  = [], threading.Lock()
-  it            = iter(erastothenes() if sieve is None else sieve)
+def segmented_sieve(lo = 2, hi = None, segment = 1 << 18):
+  """Prime numbers p w/ lo <= p < hi (or all primes >= lo, if hi is
+  None), generated using a segmented Sieve of Eratosthenes w/ a
+  2*3*5 wheel: a bytearray of segment bytes -- one per number
+  coprime to 30 -- at a time."""
+  for ps in _prime_segments(lo, hi, segment):
+    for p in ps: yield p
+
+def primes_array(n):
+  """Prime numbers <= n (as an array)."""
+  A = array(_U64)
+  for ps in _prime_segments(2, n + 1): A.extend(ps)
+  return A
+
+_WHEEL      = (1, 7, 11, 13, 17, 19, 23, 29)  # coprime to 30
+_WHEEL_POS  = dict( (r,i) for i, r in enumerate(_WHEEL) )
+
+def _prime_segments(lo, hi, segment = 1 << 18):                 # {{{1
+  """Generates arrays of the prime numbers p w/ lo <= p < hi, one per
+  segment (see segmented_sieve)."""
+  W, P, one = _WHEEL, _WHEEL_POS, b"\x01"
+  ps = array(_U64, [ p for p in (2, 3, 5)
+                     if lo <= p and (hi is None or p < hi) ])
+  if ps: yield ps
+  k, size, sq, sieving = max(lo, 0) // 30, max(segment // 8, 1), 0, []
+  while hi is None or 30*k < hi:
+    k1 = k + size if hi is None else min(k + size, (hi + 29) // 30)
+    base, end, S = 30*k, 30*k1, 8*(k1 - k)
+    if sq*sq < end:
+      sq = max(2*sq, _isqrt(end) + 1)
+      sieving = [ p for p in _small_primes(sq) if p > 5 ]
+    seg = bytearray(one) * S
+    if k == 0: seg[0] = 0                                       # 1
+    for p in sieving:
+      if p*p >= end: break
+      m0 = max(p, -(-base // p))
+      for w in W:                     # multiples p*m w/ m = w (mod 30)
+        q = p * (m0 + (w - m0) % 30)
+        j = 8*(q // 30 - k) + P[q % 30]
+        if j < S: seg[j::8*p] = bytearray((S - 1 - j) // (8*p) + 1)
+    ps, j = array(_U64), seg.find(one)
+    while j >= 0:
+      ps.append(base + 30*(j >> 3) + W[j & 7]); j = seg.find(one, j + 1)
+    if base < lo or (hi is not None and end > hi):
+      ps = array(_U64, [ p for p in ps
+                         if lo <= p and (hi is None or p < hi) ])
+    yield ps; k = k1
+                                                                # }}}1
+
+def _small_primes(n):                                           # {{{1
+  """Prime numbers < n (using a simple sieve of odd numbers)."""
+  if n < 3: return []
+  s = bytearray(b"\x01") * (n // 2); s[0] = 0           # s[i]: 2*i+1
+  for i in xrange(1, (_isqrt(n) + 1) // 2):
+    if s[i]:
+      p = 2*i + 1; j = p*p // 2
+      if j < len(s): s[j::p] = bytearray((len(s) - 1 - j) // p + 1)
+  return [2] + [ 2*i + 1 for i in xrange(1, len(s)) if s[i] ]
+                                                                # }}}1
+
+def _isqrt(n):                                                  # {{{1
+  """Integer square root of n >= 0."""
+  if n == 0: return 0
+  x = 1 << ((n.bit_length() + 1) // 2)
+  while True:
+    y = (x + n // x) // 2
+    if y >= x: return x
+    x = y
+                                                                # }}}1
+
+def _make_prime_sieve(sieve = None, table = (), batch = 4096):  # {{{1
+  """Generate lazy memoising prime sieve, starting w/ the primes in
+  table (a sequence of the first primes, e.g. a load_prime_table()).
+
+  The memo is a list of immutable chunks (arrays of primes; or
+  tuples of batch primes from sieve, if not None), which readers
+  iterate w/o locking; only a reader that runs past the last chunk
+  takes the lock, to append (by itself) a new chunk: a whole segment
+  of segmented_sieve."""
+  CHUNKS, lock  = [table] if len(table) else [], threading.Lock()
+  last          = table[-1] if len(table) else 1
+  if sieve is None: source = _prime_segments(last + 1, None)
+  else:
+    it      = ( p for p in sieve if p > last )
+    source  = iter(lambda: tuple(itertools.islice(it, batch)), ())
+  def extend(i):
+    with lock:
+      while len(CHUNKS) <= i:
+        c = next(source, None)
+        if c is None: return False
+        CHUNKS.append(c)
+    return True
   def primes():
     """Generates all primes (i.e. lazy, memoising prime sieve; uses
-    erastothenes())."""
-    n = 0
-    while True:
-      with lock:
-        if n < len(PRIMES): p = PRIMES[n]
-        else:
-          p = next(it); PRIMES.append(p)
-      yield p; n += 1
+    segmented_sieve())."""
+    i = 0
+    while i < len(CHUNKS) or extend(i):
+      for p in CHUNKS[i]: yield p
+      i += 1
   return primes
                                                                 # }}}1
 
 mprimes = _make_prime_sieve()   # memoised primes
 lprimes = llist(erastothenes()) # lazy primes; slower
 
-def primes_up_to(n, ps = None):
-  """Prime numbers <= n."""
-  if ps is None: ps = mprimes()
-  return itertools.takewhile(lambda p: p <= n, ps)
+_PRIME_TABLE        = ()
+_PRIME_TABLE_MAGIC  = b"PRIMES01"
+
+def save_prime_table(path, n):
+  """Save the prime numbers <= n to file: a header (magic, count)
+  followed by the primes as little-endian unsigned 64-bit ints."""
+  ps = primes_array(n)
+  if sys.byteorder == "big": ps.byteswap()
+  with open(path, "wb") as f:
+    f.write(struct.pack("<8sQ", _PRIME_TABLE_MAGIC, len(ps)))
+    ps.tofile(f)
+
+def load_prime_table(path):                                     # {{{1
+  """Load primes saved w/ save_prime_table(): a read-only view of
+  the memory-mapped file (whose pages are thus shared between
+  processes) on little-endian hosts (and python >= 3.3); otherwise,
+  an array (copy)."""
+  with open(path, "rb") as f:
+    magic, n = struct.unpack("<8sQ", f.read(16))
+    if magic != _PRIME_TABLE_MAGIC:
+      raise ValueError("not a prime table")
+    if hasattr(memoryview, "cast") and sys.byteorder == "little":
+      m = mmap.mmap(f.fileno(), 0, access = mmap.ACCESS_READ)
+      return memoryview(m)[16:16 + 8*n].cast("Q")
+    A = array(_U64); A.fromfile(f, n)
+  if sys.byteorder == "big": A.byteswap()
+  return A
+                                                                # }}}1
+
+def use_prime_table(path):
+  """Make mprimes and primes_up_to (and thus prime_factors etc.)
+  start w/ the primes in the prime table file (see
+  load_prime_table); or stop using a table if path is None."""
+  global mprimes, _PRIME_TABLE
+  _PRIME_TABLE  = () if path is None else load_prime_table(path)
+  mprimes       = _make_prime_sieve(table = _PRIME_TABLE)
+
+def primes_up_to(n, ps = None):                                 # {{{1
+  """Prime numbers <= n (if ps is None: from the prime table in use,
+  if any, and/or primes_array)."""
+  if ps is not None: return itertools.takewhile(lambda p: p <= n, ps)
+  T = _PRIME_TABLE
+  if not len(T): return iter(primes_array(n))
+  i = bisect.bisect_right(T, n)
+  if i < len(T): return iter(T[:i])
+  return itertools.chain(T, segmented_sieve(T[-1] + 1, n + 1))
+                                                                # }}}1
+
+_MR_BASES     = (2, 3, 5, 7, 11, 13, 17, 19, 23, 29, 31, 37, 41)
+_MR_MAX       = 3317044064679887385961981   # bases above suffice
+_TRIAL_PRIMES = _small_primes(1000)
+
+def is_prime(n, rounds = 16):                                   # {{{1
+  """Is n prime?  Uses the Miller-Rabin test: deterministic (w/ the
+  first 13 primes as bases) for n < 3.3e24 (e.g. all 64-bit n);
+  probabilistic (w/ rounds additional random bases) above that."""
+  if n < 2: return False
+  for p in _MR_BASES:
+    if n % p == 0: return n == p
+  d, r = n - 1, 0
+  while d % 2 == 0: d //= 2; r += 1
+  def witness(a):
+    x = pow(a, d, n)
+    if x == 1 or x == n - 1: return False
+    for _ in xrange(r - 1):
+      x = x * x % n
+      if x == n - 1: return False
+    return True
+  if any( witness(a) for a in _MR_BASES ): return False
+  if n < _MR_MAX: return True
+  rng = random.Random(n)
+  return not any( witness(rng.randrange(2, n - 1))
+                  for _ in xrange(rounds) )
+                                                                # }}}1
+
+def _pollard_brent(n):                                          # {{{1
+  """A non-trivial factor of odd composite n (Pollard's rho algorithm
+  w/ Brent's cycle detection)."""
+  rng, m = random.Random(n), 128
+  while True:
+    y, c, g, r, q = rng.randrange(1, n), rng.randrange(1, n), 1, 1, 1
+    while g == 1:
+      x = y
+      for _ in xrange(r): y = (y*y + c) % n
+      k = 0
+      while k < r and g == 1:
+        ys = y
+        for _ in xrange(min(m, r - k)):
+          y = (y*y + c) % n; q = q * abs(x - y) % n
+        g = gcd(q, n); k += m
+      r *= 2
+    if g == n:                        # backtrack (one step at a time)
+      g = 1
+      while g == 1: ys = (ys*ys + c) % n; g = gcd(abs(x - ys), n)
+    if g != n: return int(g)                  # python 2: not long
+                                                                # }}}1
+
+class SPFTable(object):                                         # {{{1
+  """Table of the smallest prime factor of each 0 < m <= n (in an
+  array), for factoring (many) m quickly and computing multiplicative
+  functions for all m at once."""
+  __slots__ = "n spf".split()
+  def __init__(self, n):
+    tc = "i" if n < 2**31 else _I64; S = array(tc, xrange(n + 1))
+    for p in reversed(_small_primes(_isqrt(n) + 1)):
+      S[p*p::p] = array(tc, [p]) * ((n - p*p) // p + 1)
+    self.n, self.spf = n, S
+  def factor(self, m):
+    """Prime factors of 0 < m <= n (sorted)."""
+    S = self.spf
+    while m > 1: p = S[m]; yield p; m //= p
+  def factorize(self, m):
+    """Prime factors of 0 < m <= n w/ multiplicities: [(p, e), ...]."""
+    fs = []
+    for p in self.factor(m):
+      if fs and fs[-1][0] == p: fs[-1][1] += 1
+      else: fs.append([p, 1])
+    return [ tuple(x) for x in fs ]
+  def factor_many(self, ms):
+    """Prime factors of each m in ms (as lists)."""
+    return ( list(self.factor(m)) for m in ms )
+  def multiplicative(self, f, typecode = _I64):                 # {{{2
+    """Array of the values (for 0 <= m <= n; 0 at 0) of the
+    multiplicative function w/ value f(p, e) at p**e; one pass."""
+    S, n = self.spf, self.n; tc = S.typecode
+    v = array(typecode, [0]) * (n + 1)
+    P, E = array(tc, [0]) * (n + 1), array("b", [0]) * (n + 1)
+    if n >= 1: v[1] = 1
+    for i in xrange(2, n + 1):
+      p = S[i]; m = i // p
+      if S[m] == p: P[i], E[i] = P[m] * p, E[m] + 1
+      else:         P[i], E[i] = p, 1
+      v[i] = v[i // P[i]] * f(p, E[i])
+    return v
+                                                                # }}}2
+  def totients(self):
+    """Euler's totient function phi(m), for 0 <= m <= n."""
+    return self.multiplicative(lambda p, e: (p - 1) * p**(e - 1))
+  def mobius(self):
+    """Moebius function mu(m), for 0 <= m <= n."""
+    return self.multiplicative(lambda p, e: -1 if e == 1 else 0, "b")
+  def divisor_counts(self):
+    """Number of divisors d(m), for 0 <= m <= n."""
+    return self.multiplicative(lambda p, e: e + 1)
+  def divisor_sums(self):
+    """Sum of divisors sigma(m), for 0 <= m <= n."""
+    return self.multiplicative(lambda p, e: (p**(e + 1) - 1) // (p - 1))
+                                                                # }}}1
+
+_SPF_TABLE = None
+
+def use_spf_table(n):
+  """Make prime_factors use an SPFTable(n) (and return it); or stop
+  using a table if n is None."""
+  global _SPF_TABLE
+  _SPF_TABLE = None if n is None else SPFTable(n)
+  return _SPF_TABLE
 
 def prime_factors(n, ps = None):                                # {{{1
-  """Prime factors of n."""
-  if ps is None: ps = mprimes()
+  """Prime factors of n (sorted): using trial division by the primes
+  ps, if not None; otherwise, the SPFTable in use (if n is in its
+  range) or trial division by small primes, then is_prime and
+  _pollard_brent for what remains."""
+  T = _SPF_TABLE
+  if ps is None and T is not None and 0 < n <= T.n:
+    for p in T.factor(n): yield p
+    return
+  rho = ps is None
+  if rho: ps = _TRIAL_PRIMES
   for p in itertools.takewhile(lambda p: p*p <= n, ps):
     while n > 1:
       q, r = divmod(n, p)
       if r != 0: break
       n = q; yield p
     if n == 1: break
+  else:
+    if rho and n >= 1000**2:
+      for p in sorted(_factorise(n)): yield p
+      return
   if n != 1: yield n
                                                                 # }}}1
 
+def _factorise(n):
+  """Prime factors of n w/o factors < 1000 (unsorted)."""
+  if is_prime(n): return [n]
+  d = _pollard_brent(n)
+  return _factorise(d) + _factorise(n // d)
+
 def divisors(n, factors = None):
   """Divisors of n (sorted)."""
   ps = tuple((prime_factors if factors is None else factors)(n))